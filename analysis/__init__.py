@@ -0,0 +1,11 @@
+"""QC module analysis of FastQC files.
+
+FastQCReport is the programmatic entry point; errors are raised as the
+exceptions defined in analysis.exceptions.
+"""
+from analysis.exceptions import (FastQCError, FormatError, ModuleMissingError,
+                                 OutputExistsError)
+from analysis.report import FastQCReport
+
+__all__ = ['FastQCReport', 'FastQCError', 'FormatError', 'ModuleMissingError',
+           'OutputExistsError']
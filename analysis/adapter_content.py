@@ -1,21 +1,31 @@
 """This module contains functionality for generating reports and visualising
 Adapter content data from FastQC files.
 """
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
+
+# line colour of each adapter, in legend order
+ADAPTER_COLORS = {'Illumina Universal Adapter': 'red',
+                  'Illumina Small RNA Adapter': 'blue',
+                  'Nextera Transposase Sequence': 'black',
+                  'SOLID Small RNA Adapter': 'pink'}
 
 
 class AdapterContent(Module):
     """Class for analysis of Adapter Content module data from FastQC."""
+    # types of the columns in the module table
+    dtypes = (int, float, float, float, float)
 
-    def __init__(self, fastqc, outdir):
+    def __init__(self, fastqc, outdir, **kwargs):
         """
         Constructor for Adaptor Content objects
 
@@ -23,10 +33,13 @@ class AdapterContent(Module):
         :type fastqc: str
         :param outdir: output directory
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(fastqc, outdir)
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Adapter Content'
 
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
@@ -35,63 +48,94 @@ class AdapterContent(Module):
         :raises::ValueError: module data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            data = [(int(line[0]), float(line[1]), float(line[2]), float(line[3]),
-                     float(line[4])) for line in lines[2:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['Position']
         return df
 
-    def create_graph(self):
-        """Plot graph for Adapter content and save as PNG file.
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
 
         :return: None
         :rtype: None
         """
-        df = self.prep_data()
-        # plot graph
         sns.set_style('darkgrid')
-        fig, ax = plt.subplots(figsize=(12, 6))
-        sns.lineplot(x=df['Position'],
-                     y=df['Illumina Universal Adapter'].cumsum(),
-                     label='Illumina Universal Adapter', color='red')
-
-        sns.lineplot(x=df['Position'],
-                     y=df['Illumina Small RNA Adapter'].cumsum(),
-                     label='Illumina Small RNA Adapter', color='blue')
-        sns.lineplot(x=df['Position'],
-                     y=df['Nextera Transposase Sequence'].cumsum(),
-                     label='Nextera Transposase Sequence', color='black')
-        sns.lineplot(x=df['Position'], y=df['SOLID Small RNA Adapter'].cumsum(),
-                     label='SOLID Small RNA Adapter', color='pink')
+
+    def template_key(self, df):
+        """Layout of the graph: the read positions.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: read positions
+        :rtype: tuple
+        """
+        return tuple(df['Position'])
+
+    def build_template(self, df):
+        """Build the Adapter Content figure.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: template with the figure and one line per adapter
+        :rtype: dict
+        """
+        fig = Figure(figsize=(12, 6))
+        ax = fig.subplots()
+        lines = []
+        for adapter, color in ADAPTER_COLORS.items():
+            lines += plotting.lineplot(ax, x=df['Position'],
+                                       y=df[adapter].cumsum(),
+                                       label=adapter, color=color)
 
         ax.legend(loc='best', facecolor='white')
         ax.set_xlabel('Position in read (bp)')
         ax.set_ylabel('Cumulative proportion of library (%)')
         ax.set_title('% Adapter')
-        plt.yticks(np.arange(0, 101, 10))
         ax.axes.set_xlim(0)
         # format tick lables on x axis so first 9 base are shown
         # then intervals of 2
         tick_labels = np.concatenate([np.arange(1, 10),
                                       df['Position'][10::2].values])
-        plt.xticks(tick_labels, fontsize=8)
-        plt.yticks(fontsize=8)
-        plt.gcf().axes[0].yaxis.get_major_formatter().set_scientific(False)
+        ax.set_xticks(tick_labels)
+        ax.tick_params(labelsize=8)
+        ax.yaxis.get_major_formatter().set_scientific(False)
         # Show the spine of the axes
         for s in ['left', 'bottom']:
             ax.spines[s].set_linewidth(1)
             ax.spines[s].set_color('black')
         # remove top axis
         ax.spines['top'].set_visible(False)
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+        return dict(fig=fig, ax=ax, lines=lines)
+
+    def fill_template(self, template, df):
+        """Update the adapter lines with the data of a sample.
+
+        :param template: template built by build_template
+        :type template: dict
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: None
+        :rtype: None
+        """
+        ax = template['ax']
+        plotting.set_ydata(ax, template['lines'],
+                           [df[adapter].cumsum()
+                            for adapter in ADAPTER_COLORS])
+        # the percentage ticks widen the autoscaled limits to 0-100
+        ax.set_yticks(np.arange(0, 101, 10))
+
+    def create_graph(self):
+        """Plot graph for Adapter content and save to the graph file.
+
+        :return: None
+        :rtype: None
+        """
+        df = self.prep_data()
+        self.save_graph(self.template_figure(df))
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for Adapter content analysis.
@@ -100,8 +144,10 @@ class AdapterContent(Module):
         :rtype:
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -0,0 +1,257 @@
+"""This module contains functionality for aggregating QC module tables from
+many FastQC files into columnar storage and plotting them across samples.
+
+Each module's typed table is stacked over all samples with a leading 'sample'
+column and written to one Parquet file per module, or to a NumPy NPZ archive
+if pyarrow is not installed. Cross-sample graphs are drawn from these stored
+tables, so the FastQC text files are only parsed once.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from analysis.exceptions import FastQCError, FormatError
+from analysis.fastqc_file import FastQCFile
+
+logger = logging.getLogger(__name__)
+
+# subdirectory of the output directory holding the stored tables and graphs
+STORE_DIR = 'aggregate'
+# most sample labels drawn on the y axis of cross-sample heatmaps
+MAX_SAMPLE_LABELS = 60
+
+
+def parse_sample(sample, infile, classes):
+    """Parse the tables of all QC modules in one FastQC file.
+
+    :param sample: sample name added to each table
+    :type sample: str
+    :param infile: FastQC file
+    :type infile: str
+    :param classes: QC module classes to parse
+    :type classes: list
+    :return: sample tables keyed by module name
+    :rtype: dict
+    """
+    fastqc = FastQCFile(infile)
+    tables = {}
+    for module_class in classes:
+        module = module_class(fastqc, '')
+        module.lines = fastqc.lines(module.name)
+        if not module.lines:
+            continue
+        try:
+            df = module.table()
+        except FormatError:
+            logger.warning(
+                f'{sample}: {module.name} data is not in FastQC format.')
+            continue
+        df.insert(0, 'sample', sample)
+        tables[module.name] = df
+    return tables
+
+
+def store_path(store, name):
+    """Path of a stored module table, without its file extension.
+
+    :param store: directory of stored tables
+    :type store: str
+    :param name: QC module name
+    :type name: str
+    :return: path without extension
+    :rtype: str
+    """
+    return os.path.join(store, name.replace(' ', '_'))
+
+
+def write_table(df, path):
+    """Write a table to Parquet, or to NPZ if pyarrow is unavailable.
+
+    :param df: table to write
+    :type df: pandas.DataFrame
+    :param path: path without file extension
+    :type path: str
+    :return: path of the written file
+    :rtype: str
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        # string columns are stored as fixed-width unicode so they load
+        # without pickle
+        columns = {column: (df[column].to_numpy().astype(str)
+                            if df[column].dtype == object
+                            else df[column].to_numpy())
+                   for column in df.columns}
+        np.savez(path + '.npz', **columns)
+        return path + '.npz'
+    df.to_parquet(path + '.parquet', index=False)
+    return path + '.parquet'
+
+
+def read_table(store, name):
+    """Read a stored module table.
+
+    :param store: directory of stored tables
+    :type store: str
+    :param name: QC module name
+    :type name: str
+    :return: table stacked over all samples
+    :rtype: pandas.DataFrame
+    :raises: FileNotFoundError: if no table is stored for the module
+    """
+    path = store_path(store, name)
+    if os.path.exists(path + '.parquet'):
+        return pd.read_parquet(path + '.parquet')
+    with np.load(path + '.npz') as npz:
+        return pd.DataFrame({column: npz[column] for column in npz.files})
+
+
+def aggregate(samples, outdir, classes, jobs=None):
+    """Parse many FastQC files and store each module's table, stacked over
+    all samples, in the aggregate directory of the output directory.
+
+    :param samples: FastQC file for each sample name
+    :type samples: dict
+    :param outdir: output directory
+    :type outdir: str
+    :param classes: QC module classes to parse
+    :type classes: list
+    :param jobs: number of worker processes parsing files
+    :type jobs: int
+    :return: directory of stored tables and the samples that could not be
+        read and were skipped
+    :rtype: tuple(str, list)
+    """
+    store = os.path.join(outdir, STORE_DIR)
+    os.makedirs(store, exist_ok=True)
+    stacked = {}
+    skipped = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {sample: pool.submit(parse_sample, sample, infile, classes)
+                   for sample, infile in samples.items()}
+        for sample, future in futures.items():
+            try:
+                tables = future.result()
+            except (OSError, EOFError, ValueError, FastQCError) as e:
+                # e.g. an unreadable or non-UTF-8 file
+                logger.warning(f'{sample}: {e}')
+                skipped.append(sample)
+                continue
+            for name, df in tables.items():
+                stacked.setdefault(name, []).append(df)
+    for name, frames in stacked.items():
+        path = write_table(pd.concat(frames, ignore_index=True),
+                           store_path(store, name))
+        logger.info(f'Table file generated for {name}: {path}')
+    return store, skipped
+
+
+def label_samples(ax, samples):
+    """Label the rows of a cross-sample heatmap, thinning the labels when
+    there are many samples.
+
+    :param ax: axes of the heatmap
+    :type ax: matplotlib.axes.Axes
+    :param samples: sample name of each row
+    :type samples: pandas.Index
+    :return: None
+    :rtype: None
+    """
+    step = max(1, -(-len(samples) // MAX_SAMPLE_LABELS))
+    ax.set_yticks(np.arange(0, len(samples), step))
+    ax.set_yticklabels(samples[::step], fontsize=6)
+
+
+def plot_quality_heatmap(store, path, dpi=300, tight=True):
+    """Plot the median quality per base of every sample as a heatmap.
+
+    :param store: directory of stored tables
+    :type store: str
+    :param path: graph file to write
+    :type path: str
+    :param dpi: resolution of raster graphs
+    :type dpi: int
+    :param tight: crop the graph to its content
+    :type tight: bool
+    :return: None
+    :rtype: None
+    """
+    df = read_table(store, 'Per base sequence quality')
+    df = df.pivot(index='sample', columns='Base', values='Median')
+    fig = Figure(figsize=(12, max(4, len(df.index) * 0.12)))
+    ax = fig.subplots()
+    image = ax.imshow(df.to_numpy(), cmap='RdYlGn', vmin=0, vmax=40,
+                      aspect='auto', interpolation='nearest')
+    fig.colorbar(image, ax=ax, label='Median quality score (Phred)')
+    ax.set_title('Median quality per base across samples')
+    ax.set_xlabel('Position in read (bp)')
+    ax.set_ylabel('Sample')
+    step = max(1, -(-df.columns.size // 50))
+    ax.set_xticks(np.arange(0, df.columns.size, step))
+    ax.set_xticklabels(df.columns[::step], fontsize=6)
+    label_samples(ax, df.index)
+    fig.savefig(path, dpi=dpi, bbox_inches='tight' if tight else None)
+
+
+def plot_gc_content(store, path, dpi=300, tight=True):
+    """Plot the GC content distribution of every sample, each normalised to
+    its number of reads.
+
+    :param store: directory of stored tables
+    :type store: str
+    :param path: graph file to write
+    :type path: str
+    :param dpi: resolution of raster graphs
+    :type dpi: int
+    :param tight: crop the graph to its content
+    :type tight: bool
+    :return: None
+    :rtype: None
+    """
+    df = read_table(store, 'Per sequence GC content')
+    totals = df.groupby('sample')['Count'].transform('sum')
+    df['Fraction'] = df['Count'] / totals
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    for _, sample in df.groupby('sample', sort=False):
+        ax.plot(sample['GC Content'], sample['Fraction'] * 100,
+                color='blue', alpha=0.3, linewidth=0.8)
+    ax.set_title('GC distribution over all sequences across samples')
+    ax.set_xlabel('Mean GC content (%)')
+    ax.set_ylabel('Reads (%)')
+    ax.set_xlim(0, 100)
+    ax.set_ylim(0)
+    for s in ['top', 'right']:
+        ax.spines[s].set_visible(False)
+    fig.savefig(path, dpi=dpi, bbox_inches='tight' if tight else None)
+
+
+def plot_aggregate(store, graph_format='png', dpi=300, tight=True):
+    """Draw the cross-sample graphs from stored tables, skipping graphs whose
+    module table was not stored.
+
+    :param store: directory of stored tables
+    :type store: str
+    :param graph_format: graph file format
+    :type graph_format: str
+    :param dpi: resolution of raster graphs
+    :type dpi: int
+    :param tight: crop graphs to their content
+    :type tight: bool
+    :return: None
+    :rtype: None
+    """
+    graphs = dict(quality_heatmap=plot_quality_heatmap,
+                  gc_content=plot_gc_content)
+    for name, plot in graphs.items():
+        path = os.path.join(store, f'{name}.{graph_format}')
+        try:
+            plot(store, path, dpi=dpi, tight=tight)
+        except FileNotFoundError:
+            continue
+        logger.info(f'Graph file generated for {name}: {path}')
@@ -1,65 +1,90 @@
 """This module contains functionality for generating reports and visualising
 Per base N content data from FastQC files.
 """
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
 
 
 class PerBaseNContent(Module):
     """Class for Per base N content QC module."""
-    def __init__(self, fastqc, outdir):
+    # types of the columns in the module table
+    dtypes = (int, float)
+
+    def __init__(self, fastqc, outdir, **kwargs):
         """Constructor for Per base N content objects
 
         :param fastqc: input fastqc
         :type fastqc: str
         :param outdir: output directory
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(fastqc, outdir)
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Per base N content'
 
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df: pandas dataframe containing data for plotting
         :rtype: pandas.DataFrame
-        :raises: ValueError: module data not in FastQC format
+        :raises: FormatError: module data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            data = [(int(line[0]), float(line[1])) for line in lines[2:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['Base']
             return df
 
-    def create_graph(self):
-        """Plot graph for base N content and save as PNG file.
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
 
         :return: None
         :rtype: None
         """
-        df = self.prep_data()
         sns.set_style('darkgrid')
-        fig, ax = plt.subplots(figsize=(10, 8))
-        sns.lineplot(x=df['Base'], y=df['N-Count'] * 100, label='%N',
-                     color='red')
+
+    def template_key(self, df):
+        """Layout of the graph: the base positions.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: base positions
+        :rtype: tuple
+        """
+        return tuple(df['Base'])
+
+    def build_template(self, df):
+        """Build the Per base N content figure.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: template with the figure and the N content line
+        :rtype: dict
+        """
+        fig = Figure(figsize=(10, 8))
+        ax = fig.subplots()
+        lines = plotting.lineplot(ax, x=df['Base'], y=df['N-Count'] * 100,
+                                  label='%N', color='red')
         ax.legend(facecolor='white')
         ax.set_title('N content across all bases')
-        plt.xlim(df.index.min(), df.index.max())
-        plt.xticks(df.index[::2])
-        plt.yticks(np.arange(0, 101, 10))
-        plt.ylim(0, 100)
+        ax.set_xlim(df.index.min(), df.index.max())
+        ax.set_xticks(df.index[::2])
+        ax.set_yticks(np.arange(0, 101, 10))
+        ax.set_ylim(0, 100)
         ax.set_xlabel('Position in read (bp)')
         ax.set_ylabel('Percentage of base calls (%)')
         # Show the spine of the axes
@@ -68,11 +93,31 @@ class PerBaseNContent(Module):
             ax.spines[s].set_color('black')
         # remove top axis
         ax.spines['top'].set_visible(False)
+        return dict(fig=fig, ax=ax, lines=lines)
+
+    def fill_template(self, template, df):
+        """Update the N content line with the data of a sample.
+
+        :param template: template built by build_template
+        :type template: dict
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: None
+        :rtype: None
+        """
+        plotting.set_ydata(template['ax'], template['lines'],
+                           [df['N-Count'] * 100])
+
+    def create_graph(self):
+        """Plot graph for base N content and save to the graph file.
+
+        :return: None
+        :rtype: None
+        """
+        df = self.prep_data()
         # save figure
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+        self.save_graph(self.template_figure(df))
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for Per base N content analysis.
@@ -81,8 +126,10 @@ class PerBaseNContent(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -1,61 +1,88 @@
 """This module contains functionality for generating reports and visualising
 Per base sequence content data from FastQC files."""
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
+
+# line colour of each base, in legend order
+BASE_COLORS = dict(G='red', A='blue', T='green', C='black')
 
 
 class PerBaseSeqContent(Module):
     """Class for Per base sequence content QC module."""
-    def __init__(self, fastqc, outdir):
+    # types of the columns in the module table
+    dtypes = (int, float, float, float, float)
+
+    def __init__(self, fastqc, outdir, **kwargs):
         """Constructor for PerBaseSeqContent objects
 
         :param fastqc: input FastQC file
         :type fastqc: str
         :param outdir: output directory
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(fastqc, outdir)
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Per base sequence content'
 
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df: pandas dataframe containing data for plotting
         :rtype: pandas.DataFrame
-        :raises: ValueError: module data not in FastQC format
+        :raises: FormatError: module data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            data = [(int(line[0]), float(line[1]), float(line[2]), float(line[3]),
-                     float(line[4])) for line in lines[2:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['Base']
             return df
 
-    def create_graph(self):
-        """Plot graph for Per base sequence content and save as PNG file.
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
 
         :return: None
         :rtype: None
         """
-        df = self.prep_data()
         sns.set_style('darkgrid')
-        fig, ax = plt.subplots(figsize=(12, 6))
-        sns.lineplot(x=df['Base'], y=df['G'], color='red', label='% G')
-        sns.lineplot(x=df['Base'], y=df['A'], color='blue', label='% A')
-        sns.lineplot(x=df['Base'], y=df['T'], color='green', label='% T')
-        sns.lineplot(x=df['Base'], y=df['C'], color='black', label='% C')
+
+    def template_key(self, df):
+        """Layout of the graph: the base positions.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: base positions
+        :rtype: tuple
+        """
+        return tuple(df['Base'])
+
+    def build_template(self, df):
+        """Build the Per base sequence content figure.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: template with the figure and one line per base
+        :rtype: dict
+        """
+        fig = Figure(figsize=(12, 6))
+        ax = fig.subplots()
+        lines = []
+        for base, color in BASE_COLORS.items():
+            lines += plotting.lineplot(ax, x=df['Base'], y=df[base],
+                                       color=color, label=f'% {base}')
 
         # configure legend
         ax.legend(loc='upper right', facecolor='white', frameon=True)
@@ -65,19 +92,40 @@ class PerBaseSeqContent(Module):
         ax.set_ylabel('Proportion (%)')
         ax.set_xticks(df.index[::2])
         ax.axes.set_xlim(0)
-        ax.set_yticks(np.arange(0, 101, 10))
 
         # configure spines of axes
         for s in ['left', 'bottom']:
             ax.spines[s].set_linewidth(1)
             ax.spines[s].set_color('black')
         ax.spines['top'].set_visible(False)
+        return dict(fig=fig, ax=ax, lines=lines)
 
+    def fill_template(self, template, df):
+        """Update the base lines with the data of a sample.
+
+        :param template: template built by build_template
+        :type template: dict
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: None
+        :rtype: None
+        """
+        ax = template['ax']
+        plotting.set_ydata(ax, template['lines'],
+                           [df[base] for base in BASE_COLORS])
+        # the percentage ticks widen the autoscaled limits to 0-100
+        ax.set_yticks(np.arange(0, 101, 10))
+
+    def create_graph(self):
+        """Plot graph for Per base sequence content and save to the graph file.
+
+        :return: None
+        :rtype: None
+        """
+        df = self.prep_data()
         # Save plot
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+        self.save_graph(self.template_figure(df))
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for Per base sequence content analysis.
@@ -86,8 +134,10 @@ class PerBaseSeqContent(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -2,31 +2,49 @@
 Per tile sequence quality data from FastQC files.
 """
 
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
+import matplotlib.style
 import numpy as np
-import pandas as pd
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis.exceptions import FormatError
+from analysis.fastqc_file import FastQCFile
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
 
 
 class PerBaseSeqQlty(Module):
     """Class for storing and analysing Per base sequence quality FastQC module
     data.
     """
+    # types of the columns in the module table
+    dtypes = (int, float, float, float, float, float, float)
 
-    def __init__(self, fastqc, outdir):
+    def __init__(self, fastqc, outdir, **kwargs):
         """Constructor for Per base sequence quality object
 
         :param fastqc: input FastQC file
         :type fastqc: str
         :param outdir: output directory for module reports and graphs
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(fastqc, outdir)
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Per base sequence quality'
+        self.encoding = None
+
+    def parse_text(self):
+        """Parse the module and its encoding, so the graph can be drawn
+        without the rest of the FastQC file.
+
+        :return: None
+        :rtype: None
+        """
+        super().parse_text()
+        self.get_encoding()
 
     def get_encoding(self):
         """Extract encoding information from FastQC file.
@@ -34,48 +52,60 @@ class PerBaseSeqQlty(Module):
         :return: encoding: type of quality score encoding
         :rtype: str
         """
-        encoding = ''
-        fr = open(self.infile, 'r')
-        for line in fr.readlines():
-            if line.startswith('Encoding'):
-                encoding = line.strip('\n').split('\t')[1]
-                break
-        return encoding
-
+        if self.encoding is None:
+            if self.fastqc is None:
+                self.fastqc = FastQCFile(self.infile)
+            self.encoding = self.fastqc.get_field('Basic Statistics',
+                                                  'Encoding')
+        return self.encoding
+
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df - DataFrame containing data for module
         :rtype: pandas.DataFrame
-        :raises: ValueError: if data not in FastQC format
+        :raises: FormatError: if data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            # cast data in each line to appropriate types
-            data = (
-                (int(line[0]), float(line[1]), float(line[2]), float(line[3]),
-                 float(line[4]), float(line[5]), float(line[6]))
-                for line in lines[2:])
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            # parse data lines into appropriately typed columns
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            # exclude module header and column lines
-            df = pd.DataFrame(data, columns=columns)
             df.index = df['Base']
             return df
 
-    def create_graph(self):
-        """Plot graph for Per base sequence quality and save as PNG file.
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
 
         :return: None
         :rtype: None
         """
-        # get dataframe from process data function
-        df = self.prep_data()
-        # Plot boxplots
-        plt.style.use('seaborn')
-        fig, ax = plt.subplots(figsize=(12, 6))
+        matplotlib.style.use('seaborn')
+
+    def template_key(self, df):
+        """Layout of the graph: the base positions, one box per base.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: base positions
+        :rtype: tuple
+        """
+        return tuple(df['Base'])
+
+    def build_template(self, df):
+        """Build the Per base sequence quality figure with its quality bands.
+
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: template with the figure, title, good quality span, box
+            plot artists and mean line
+        :rtype: dict
+        """
+        fig = Figure(figsize=(12, 6))
+        ax = fig.subplots()
 
         # extract boxplot stats from dataframe to be used for plotting
         bxpstats = [
@@ -84,27 +114,25 @@ class PerBaseSeqQlty(Module):
              "q3": df.loc[i, 'Upper Quartile'],
              "whislo": df.loc[i, '10th Percentile'],
              "whishi": df.loc[i, '90th Percentile']} for i in df.Base]
-        # create horizontal spans on figure to categorise score quality
-        ax.axhspan(28, df['90th Percentile'].max() + 2, color='green',
-                   alpha=0.3)
+        # create horizontal spans on figure to categorise score quality, the
+        # top of the good quality span follows the data
+        good = ax.axhspan(28, df['90th Percentile'].max() + 2, color='green',
+                          alpha=0.3)
         ax.axhspan(20, 28, color='yellow', alpha=0.2)
         ax.axhspan(0, 20, color='red', alpha=0.2)
 
         # style boxplot properties
         boxprops = dict(facecolor='yellow')
         medianprops = dict(linestyle='-', linewidth=1.0, color='red')
-        ax.bxp(bxpstats, boxprops=boxprops, medianprops=medianprops,
-               showbox=True, showfliers=False, patch_artist=True)
-        ax.plot(df['Mean'], linewidth=1.0, color='blue', zorder=5)
+        boxes = ax.bxp(bxpstats, boxprops=boxprops, medianprops=medianprops,
+                       showbox=True, showfliers=False, patch_artist=True)
+        mean, = ax.plot(df['Mean'], linewidth=1.0, color='blue', zorder=5)
 
         # set plot title and axes labels
-        ax.set_title(
-            f'Quality scores across all bases ({self.get_encoding()} encoding)')
+        title = ax.set_title('')
         ax.set_xlabel('Position in read (bp)')
         ax.set_ylabel('Quality score (Phred)')
-        plt.xticks(fontsize=7)
-        plt.yticks(np.arange(0, df['90th Percentile'].max() + 2, 2), fontsize=7)
-        plt.ylim(0, df['90th Percentile'].max() + 1)
+        ax.tick_params(labelsize=7)
         # show spines of axes
         for s in ['left', 'bottom']:
             ax.spines[s].set_linewidth(1)
@@ -112,11 +140,57 @@ class PerBaseSeqQlty(Module):
 
         # Don't show top axis to prevent overlap
         ax.spines['top'].set_visible(False)
+        return dict(fig=fig, ax=ax, title=title, good=good, boxes=boxes,
+                    mean=mean)
+
+    def fill_template(self, template, df):
+        """Update the boxes, mean line, quality span and title with the data
+        of a sample.
+
+        :param template: template built by build_template
+        :type template: dict
+        :param df: module data returned by prep_data
+        :type df: pandas.DataFrame
+        :return: None
+        :rtype: None
+        """
+        ax = template['ax']
+        boxes = template['boxes']
+        q1, q3, med, low, high = (df[column].to_numpy() for column in (
+            'Lower Quartile', 'Upper Quartile', 'Median', '10th Percentile',
+            '90th Percentile'))
+        for i, box in enumerate(boxes['boxes']):
+            # box outline from the lower to the upper quartile, closed
+            box.get_path().vertices[:, 1] = (q1[i], q1[i], q3[i], q3[i],
+                                             q1[i], q1[i])
+            box.stale = True
+            boxes['medians'][i].set_ydata((med[i], med[i]))
+            boxes['whiskers'][2 * i].set_ydata((q1[i], low[i]))
+            boxes['whiskers'][2 * i + 1].set_ydata((q3[i], high[i]))
+            boxes['caps'][2 * i].set_ydata((low[i], low[i]))
+            boxes['caps'][2 * i + 1].set_ydata((high[i], high[i]))
+        template['mean'].set_ydata(df['Mean'])
+        top = high.max()
+        good = template['good']
+        xy = good.get_xy()
+        xy[[1, 2], 1] = top + 2
+        good.set_xy(xy)
+        template['title'].set_text(
+            f'Quality scores across all bases ({self.get_encoding()} encoding)')
+        ax.set_yticks(np.arange(0, top + 2, 2))
+        ax.set_ylim(0, top + 1)
+
+    def create_graph(self):
+        """Plot graph for Per base sequence quality and save to the graph file.
+
+        :return: None
+        :rtype: None
+        """
+        # get dataframe from process data function
+        df = self.prep_data()
         # save figure
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+        self.save_graph(self.template_figure(df))
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for Per base sequence quality analysis.
@@ -125,8 +199,10 @@ class PerBaseSeqQlty(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
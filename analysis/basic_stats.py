@@ -1,21 +1,28 @@
 """This module contains functionality for displaying data from Basic Statistics
 from a FastQC file."""
+import logging
 
 from analysis.qc_module import Module
 
+logger = logging.getLogger(__name__)
+
 
 class BasicStatistics(Module):
     """Class for Basic Statistics QC module."""
+    # types of the columns in the module table
+    dtypes = (str, str)
 
-    def __init__(self, infile, outdir):
+    def __init__(self, infile, outdir, **kwargs):
         """Constructor for Basic Statistics objects
 
         :param infile: input FastQC file
         :type infile: str
         :param outdir: output directory
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(infile, outdir)
+        super().__init__(infile, outdir, **kwargs)
         self.name = 'Basic Statistics'
 
     def display_stats(self):
@@ -39,4 +46,4 @@ class BasicStatistics(Module):
         """
         super().module_output()
         self.display_stats()
-        print('Completed.\n' + '-' * 80)
+        logger.info('Completed.\n' + '-' * 80)
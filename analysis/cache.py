@@ -0,0 +1,204 @@
+"""This module provides a persistent on-disk cache of parsed FastQC sections
+and typed module tables, shared between invocations of the program.
+
+Entries are keyed by the SHA-256 hash of the input file's content. The hash of
+a file is remembered together with its path, modification time and size, so
+an unchanged file is not read again to look up its entries. Entries are
+pickled and the least recently used ones are evicted once the cache grows
+beyond its size limit.
+"""
+import hashlib
+import json
+import os
+import pickle
+
+# bump whenever the layout of cached sections or tables changes
+CACHE_VERSION = '2'
+# default size limit of the cache in bytes
+DEFAULT_MAX_SIZE = 512 * 1024 ** 2
+# name of the entry holding the section index of a file
+SECTIONS = '__sections__'
+
+
+def default_cache_dir():
+    """Directory of the cache when none is given, following the XDG base
+    directory convention.
+
+    :return: cache directory
+    :rtype: str
+    """
+    base = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'fastqc_report')
+
+
+class ParseCache:
+    """On-disk cache of parsed sections and module tables with a size limit
+    and least recently used eviction.
+    """
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        """Constructor for ParseCache objects.
+
+        :param directory: cache directory, created if it does not exist
+        :type directory: str
+        :param max_size: size limit of the cached entries in bytes
+        :type max_size: int
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+        self.entry_dir = os.path.join(self.directory, 'entries')
+        self.key_dir = os.path.join(self.directory, 'keys')
+        os.makedirs(self.entry_dir, exist_ok=True)
+        os.makedirs(self.key_dir, exist_ok=True)
+
+    def key(self, infile):
+        """Content hash of an input file, reusing the hash recorded for the
+        same path, modification time and size.
+
+        :param infile: input file
+        :type infile: str
+        :return: hex digest of the file content, or None if the input is not
+            a regular file
+        :rtype: str
+        """
+        try:
+            path = os.path.realpath(infile)
+            stat = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return None
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        record = os.path.join(
+            self.key_dir, hashlib.sha256(path.encode()).hexdigest() + '.json')
+        try:
+            with open(record, 'r') as f:
+                recorded = json.load(f)
+            if recorded['path'] == path and recorded['stamp'] == stamp:
+                return recorded['hash']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        self.write(record, json.dumps(
+            {'path': path, 'stamp': stamp, 'hash': content_hash}).encode())
+        return content_hash
+
+    def entry_path(self, key, name):
+        """Path of the cache entry for one part of a file.
+
+        :param key: content hash of the file
+        :type key: str
+        :param name: QC module name, or SECTIONS for the section index
+        :type name: str
+        :return: path of the entry
+        :rtype: str
+        """
+        digest = hashlib.sha256(
+            f'{CACHE_VERSION}:{key}:{name}'.encode()).hexdigest()
+        return os.path.join(self.entry_dir, digest + '.pkl')
+
+    def get(self, key, name):
+        """Load a cached entry and mark it as recently used.
+
+        :param key: content hash of the file
+        :type key: str
+        :param name: QC module name, or SECTIONS for the section index
+        :type name: str
+        :return: cached object, or None on a miss
+        :rtype: object
+        """
+        if key is None:
+            return None
+        path = self.entry_path(key, name)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # unreadable entry, e.g. written by another pandas version
+            self.remove(path)
+            return None
+        return value
+
+    def put(self, key, name, value):
+        """Store an entry, evicting the least recently used entries if the
+        cache is over its size limit.
+
+        :param key: content hash of the file
+        :type key: str
+        :param name: QC module name, or SECTIONS for the section index
+        :type name: str
+        :param value: object to cache
+        :type value: object
+        :return: None
+        :rtype: None
+        """
+        if key is None:
+            return
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size:
+            return
+        self.write(self.entry_path(key, name), data)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits within its
+        size limit.
+
+        :return: None
+        :rtype: None
+        """
+        entries = []
+        for entry in os.scandir(self.entry_dir):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self.remove(path)
+            total -= size
+
+    def write(self, path, data):
+        """Atomically write a file in the cache, so that concurrent runs never
+        read a partial entry.
+
+        :param path: path of the file
+        :type path: str
+        :param data: file content
+        :type data: bytes
+        :return: None
+        :rtype: None
+        """
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            # a read-only or full cache only costs the speed-up
+            self.remove(tmp)
+
+    @staticmethod
+    def remove(path):
+        """Remove a file from the cache if it still exists.
+
+        :param path: path of the file
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
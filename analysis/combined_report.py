@@ -0,0 +1,305 @@
+"""This module provides a combined report of a FastQC file: a single
+self-contained HTML page, and optionally a multi-page PDF, holding the filter
+status and graph of every QC module instead of a directory per module.
+
+Graphs are drawn by each module's ``create_graph`` and embedded as inline SVG,
+or as base64 PNG for the raster graph formats; modules without a graph show
+their table. Each report is built in memory and written in a single write.
+"""
+import base64
+import html
+import io
+import logging
+import os
+
+from analysis.qc_module import may_overwrite, outputs_newer
+
+logger = logging.getLogger(__name__)
+
+# combined report files written to the output directory
+HTML_FILE = 'report.html'
+PDF_FILE = 'report.pdf'
+# rows of a module table shown on a PDF page
+PDF_TABLE_ROWS = 40
+STATUS_COLORS = {'pass': '#2e7d32', 'warn': '#ef6c00', 'fail': '#c62828'}
+STYLE = ''.join(f'.{status} {{ background: {color}; }}\n'
+               for status, color in STATUS_COLORS.items()) + '''
+body { font-family: sans-serif; margin: 2em auto; max-width: 1100px; }
+table { border-collapse: collapse; font-size: 0.85em; }
+th, td { border: 1px solid #ccc; padding: 2px 8px; text-align: left; }
+.status { color: white; font-weight: bold; padding: 1px 6px; }
+section { margin-top: 2em; } svg, img { max-width: 100%; height: auto; }
+'''
+
+
+def status_color(status):
+    """Return the colour used for a filter status.
+
+    :param status: 'pass', 'warn' or 'fail'
+    :type status: str
+    :return: hex colour
+    :rtype: str
+    """
+    return STATUS_COLORS.get(status, 'grey')
+
+
+def anchor(name):
+    """Return the HTML anchor of a QC module section.
+
+    :param name: QC module name
+    :type name: str
+    :return: anchor id
+    :rtype: str
+    """
+    return name.lower().replace(' ', '-')
+
+
+class CombinedReport:
+    """Collects the statuses, graphs and tables of the QC modules of one
+    FastQC file and writes them as one HTML file and/or one PDF file.
+    """
+
+    def __init__(self, outdir, infile, html=True, pdf=False,
+                 on_exists='ask'):
+        """Constructor for CombinedReport objects.
+
+        :param outdir: output directory the report files are written to
+        :type outdir: str
+        :param infile: input FastQC file, shown in the report title
+        :type infile: str
+        :param html: write the HTML report
+        :type html: bool
+        :param pdf: write the PDF report
+        :type pdf: bool
+        :param on_exists: what to do if a report file exists, as for module
+            directories: 'ask', 'overwrite', 'skip' or 'fail'
+        :type on_exists: str
+        """
+        self.outdir = outdir
+        self.infile = infile
+        self.html = html
+        self.pdf = pdf
+        self.on_exists = on_exists
+        self.sections = []
+        # PDF pages after the summary page, drawn once every status is known
+        self.pages = []
+
+    @property
+    def paths(self):
+        """Paths of the report files to write."""
+        names = [HTML_FILE] * self.html + [PDF_FILE] * self.pdf
+        return [os.path.join(self.outdir, name) for name in names]
+
+    def prepare(self):
+        """Check the report files can be written under the on_exists policy.
+
+        :return: True if the report should be written, False to skip it
+            because it is newer than the input file
+        :rtype: bool
+        :raises: OutputExistsError: if a report file exists and may not be
+            overwritten
+        """
+        existing = [path for path in self.paths if os.path.exists(path)]
+        if not existing:
+            return True
+        return may_overwrite(
+            existing[0], self.on_exists,
+            lambda: (self.on_exists == 'skip'
+                     and len(existing) == len(self.paths)
+                     and outputs_newer(existing, self.infile)))
+
+    def consumer(self, module_class, **kwargs):
+        """Create a section consumer adding a QC module to the report once the
+        module's section has been read from the input.
+
+        :param module_class: QC module class
+        :type module_class: type
+        :param kwargs: options passed on to the module constructor
+        :return: consumer called with the FastQCFile being read
+        :rtype: function
+        """
+        def consume(fastqc):
+            # graphs are collected here rather than drawn by a scheduler
+            self.add(module_class(fastqc, self.outdir,
+                                  **dict(kwargs, scheduler=None)))
+        return consume
+
+    def add(self, module):
+        """Add the status and graph, or table, of a QC module to the report.
+
+        :param module: QC module, parsed from the input or not
+        :type module: analysis.qc_module.Module
+        :return: None
+        :rtype: None
+        :raises: FormatError: if the module data is not in FastQC format
+        """
+        # measured as the module total when the module has a profiler
+        with module.stage(None):
+            if module.section is None:
+                module.parse_text()
+            section = dict(name=module.name,
+                           status=module.head(1)[0].split('\t')[1].strip(),
+                           graph=None, table=None)
+            if hasattr(module, 'create_graph'):
+                module.graph_consumer = (
+                    lambda module, fig: self.add_graph(section, module, fig))
+                module.render_graph()
+            else:
+                section['table'] = module.table()
+                if self.pdf:
+                    self.add_table_page(module.name, section['table'])
+            self.sections.append(section)
+        logger.info(f'{module.name} added to combined report.')
+
+    def add_graph(self, section, module, fig):
+        """Embed a module graph in the HTML report and add it as a PDF page.
+
+        Graphs are embedded as inline SVG when the module's graph format is
+        SVG and as base64 PNG otherwise, at the module's resolution.
+
+        :param section: report section of the module
+        :type section: dict
+        :param module: QC module the graph was drawn for
+        :type module: analysis.qc_module.Module
+        :param fig: module graph
+        :type fig: matplotlib.figure.Figure
+        :return: None
+        :rtype: None
+        """
+        bbox_inches = 'tight' if module.tight else None
+        if self.html:
+            buffer = io.BytesIO()
+            if module.graph_format == 'svg':
+                fig.savefig(buffer, format='svg', bbox_inches=bbox_inches)
+                svg = buffer.getvalue().decode()
+                # drop the XML prolog and doctype before the <svg> element
+                section['graph'] = svg[svg.index('<svg'):]
+            else:
+                fig.savefig(buffer, format='png', dpi=module.dpi,
+                            bbox_inches=bbox_inches)
+                data = base64.b64encode(buffer.getvalue()).decode()
+                section['graph'] = (f'<img alt="{html.escape(module.name)}" '
+                                    f'src="data:image/png;base64,{data}">')
+        if self.pdf:
+            self.pages.append((fig, bbox_inches))
+
+    def add_table_page(self, title, df):
+        """Add the first rows of a module table to the PDF as a page.
+
+        :param title: page title
+        :type title: str
+        :param df: module table
+        :type df: pandas.DataFrame
+        :return: None
+        :rtype: None
+        """
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(11.7, 8.3))
+        ax = fig.subplots()
+        ax.axis('off')
+        if len(df) > PDF_TABLE_ROWS:
+            title = f'{title} (first {PDF_TABLE_ROWS} of {len(df)} rows)'
+        ax.set_title(title)
+        if len(df):
+            rows = df.head(PDF_TABLE_ROWS).astype(str).values.tolist()
+            table = ax.table(cellText=rows, colLabels=list(df.columns),
+                             loc='upper center', cellLoc='left')
+            table.auto_set_font_size(False)
+            table.set_fontsize(6)
+        else:
+            ax.text(0.5, 0.5, 'No data', ha='center', va='center')
+        self.pages.append((fig, None))
+
+    def summary_page(self):
+        """Draw the PDF title page listing the status of every module.
+
+        :return: summary page
+        :rtype: matplotlib.figure.Figure
+        """
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(8.3, 11.7))
+        ax = fig.subplots()
+        ax.axis('off')
+        ax.set_title(f'FastQC report: {self.title}')
+        rows = [[section['name'], section['status']]
+                for section in self.sections]
+        table = ax.table(cellText=rows, colLabels=['Module', 'Status'],
+                         loc='upper center', cellLoc='left')
+        for i, (_, status) in enumerate(rows, start=1):
+            table[i, 1].set_facecolor(status_color(status))
+            table[i, 1].get_text().set_color('white')
+        return fig
+
+    @property
+    def title(self):
+        """Name of the input shown in the report title."""
+        if isinstance(self.infile, str) and self.infile != '-':
+            return os.path.basename(self.infile)
+        return 'standard input'
+
+    def render_html(self):
+        """Build the HTML report.
+
+        :return: HTML document
+        :rtype: str
+        """
+        title = html.escape(self.title)
+        parts = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8">',
+                 f'<title>FastQC report: {title}</title>',
+                 f'<style>{STYLE}</style></head><body>',
+                 f'<h1>FastQC report: {title}</h1>',
+                 '<table><tr><th>Module</th><th>Status</th></tr>']
+        for section in self.sections:
+            name = html.escape(section['name'])
+            status = html.escape(section['status'])
+            parts.append(f'<tr><td><a href="#{anchor(section["name"])}">'
+                         f'{name}</a></td><td><span class="status {status}">'
+                         f'{status}</span></td></tr>')
+        parts.append('</table>')
+        for section in self.sections:
+            name = html.escape(section['name'])
+            status = html.escape(section['status'])
+            parts.append(f'<section id="{anchor(section["name"])}">'
+                         f'<h2>{name} <span class="status {status}">'
+                         f'{status}</span></h2>')
+            if section['graph'] is not None:
+                parts.append(section['graph'])
+            elif section['table'] is not None and len(section['table']):
+                parts.append(section['table'].to_html(index=False,
+                                                      border=0))
+            else:
+                parts.append('<p>No data.</p>')
+            parts.append('</section>')
+        parts.append('</body></html>\n')
+        return '\n'.join(parts)
+
+    def write(self):
+        """Write the report files, each in a single write.
+
+        :return: paths of the files written
+        :rtype: list
+        """
+        os.makedirs(self.outdir, exist_ok=True)
+        written = []
+        if self.html:
+            path = os.path.join(self.outdir, HTML_FILE)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.render_html())
+            written.append(path)
+        if self.pdf:
+            from matplotlib.backends.backend_pdf import PdfPages
+
+            buffer = io.BytesIO()
+            with PdfPages(buffer) as pdf:
+                pdf.savefig(self.summary_page())
+                for fig, bbox_inches in self.pages:
+                    pdf.savefig(fig, bbox_inches=bbox_inches)
+            path = os.path.join(self.outdir, PDF_FILE)
+            with open(path, 'wb') as f:
+                f.write(buffer.getvalue())
+            written.append(path)
+        for path in written:
+            logger.info(f'Combined report written to {path}.')
+        return written
@@ -0,0 +1,29 @@
+"""This module defines the exceptions raised by the analysis package, so that
+programs embedding it can handle bad input without the process exiting.
+
+Each exception also derives from the built-in exception previously raised or
+caught for the same condition, so existing handlers keep working.
+"""
+
+
+class FastQCError(Exception):
+    """Base class for errors raised while reading FastQC files or writing
+    their reports."""
+
+
+class FormatError(FastQCError, ValueError):
+    """Input is not in FastQC format, e.g. a module table with missing fields
+    or a zip archive without fastqc_data.txt."""
+
+
+class ModuleMissingError(FastQCError, KeyError):
+    """A QC module is missing from the input file."""
+
+    def __str__(self):
+        # KeyError would show the message quoted
+        return str(self.args[0]) if self.args else ''
+
+
+class OutputExistsError(FastQCError, FileExistsError):
+    """A module directory exists in the output directory and may not be
+    overwritten."""
@@ -0,0 +1,380 @@
+"""This module provides a single-pass index of the QC module sections in a
+FastQC file, shared by all FastQC module subclasses in the analysis package.
+
+Input may be a plain fastqc_data.txt, a gzipped fastqc_data.txt.gz or a FastQC
+zip archive, whose data member is streamed without being extracted to disk.
+Data can also be read from standard input ('-') or any file-like object, in
+which case it is consumed once and each section is handed to its consumer as
+soon as it has been read."""
+import gzip
+import io
+import mmap
+import os
+import sys
+import zipfile
+
+from analysis.cache import SECTIONS
+from analysis.exceptions import FormatError
+
+DATA_MEMBER = 'fastqc_data.txt'
+# file name standing for standard input
+STDIN = '-'
+# first bytes of a gzip stream
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class Section:
+    """Location and raw lines of one ``>>Module ... >>END_MODULE`` block.
+
+    Sections of a memory-mapped file hold a zero-copy ``memoryview`` of their
+    bytes and decode their lines only when asked for them, each time; other
+    sections hold their decoded lines.
+    """
+
+    def __init__(self, name, status, offset, start, end, lines=None,
+                 data=None):
+        """Constructor for Section objects.
+
+        :param name: QC module name, e.g. 'Basic Statistics'
+        :type name: str
+        :param status: filter status of the module (pass/warn/fail)
+        :type status: str
+        :param offset: byte offset of the module header line in the file
+        :type offset: int
+        :param start: line number (0-based) of the module header line
+        :type start: int
+        :param end: line number (0-based) of the '>>END_MODULE' line
+        :type end: int
+        :param lines: module lines, header included, END_MODULE excluded
+        :type lines: list
+        :param data: bytes of the module lines in a memory-mapped file, given
+            instead of lines
+        :type data: memoryview
+        """
+        self.name = name
+        self.status = status
+        self.offset = offset
+        self.start = start
+        self.end = end
+        self._lines = lines
+        self.data = data
+
+    def __getstate__(self):
+        """Decode a memory-mapped section when it is pickled, e.g. into the
+        parse cache, as the mapping cannot be.
+
+        :return: picklable object state
+        :rtype: dict
+        """
+        state = self.__dict__.copy()
+        state['_lines'] = self.lines
+        state['data'] = None
+        return state
+
+    @property
+    def lines(self):
+        """Module lines, header included, END_MODULE excluded."""
+        if self.data is None:
+            return self._lines
+        return decode_lines(self.data)
+
+    def skip(self, count):
+        """Return the length in bytes of the first lines of a memory-mapped
+        section.
+
+        :param count: number of lines
+        :type count: int
+        :return: length of the lines, the section length if it has fewer
+        :rtype: int
+        """
+        # searched in the mapping itself, memoryview has no find()
+        buffer, end = self.data.obj, self.offset + self.data.nbytes
+        pos = self.offset
+        for _ in range(count):
+            newline = buffer.find(b'\n', pos, end)
+            if newline < 0:
+                return self.data.nbytes
+            pos = newline + 1
+        return pos - self.offset
+
+    def head(self, count):
+        """Return the first lines of the section, only decoding those lines
+        of a memory-mapped section.
+
+        :param count: number of lines
+        :type count: int
+        :return: lines
+        :rtype: list
+        """
+        if self.data is None:
+            return self._lines[:count]
+        return decode_lines(self.data[:self.skip(count)])
+
+    def body(self, skip=0):
+        """Return the bytes of the section after its first lines, without
+        copying them for a memory-mapped section.
+
+        :param skip: number of lines to leave out
+        :type skip: int
+        :return: bytes of the remaining lines
+        :rtype: bytes or memoryview
+        """
+        if self.data is None:
+            return ''.join(self._lines[skip:]).encode()
+        return self.data[self.skip(skip):]
+
+
+class FastQCFile:
+    """Parsed FastQC file which reads the input once and indexes every QC
+    module section so that each Module can be handed its slice.
+    """
+
+    def __init__(self, infile, cache=None, consumers=None):
+        """Constructor for FastQCFile objects.
+
+        :param infile: input FastQC file (.txt, .txt.gz or FastQC .zip), '-'
+            for standard input or a file-like object
+        :type infile: str or file-like object
+        :param cache: on-disk cache the section index is loaded from and
+            saved to, the file is always read if None
+        :type cache: analysis.cache.ParseCache
+        :param consumers: callables keyed by QC module name, each called with
+            this object as soon as its module section has been read
+        :type consumers: dict
+        :raises: FileNotFoundError: if the input file does not exist
+        :raises: FormatError: if a zip archive holds no fastqc_data.txt
+        """
+        self.infile = infile
+        self.sections = {}
+        self.cache = cache
+        self.consumers = consumers or {}
+        self.key = None
+        if cache is not None and not is_stream(infile):
+            if not os.path.exists(infile):
+                raise FileNotFoundError(infile)
+            self.key = cache.key(infile)
+            sections = cache.get(self.key, SECTIONS)
+            if sections is not None:
+                for section in sections.values():
+                    self.add(section)
+                return
+        self.parse()
+        if self.key is not None:
+            cache.put(self.key, SECTIONS, self.sections)
+
+    def parse(self):
+        """Scan the input file once, recording each module section.
+
+        :return: None
+        :rtype: None
+        """
+        if is_stream(self.infile):
+            f = sys.stdin.buffer if self.infile == STDIN else self.infile
+            if not isinstance(f, io.TextIOBase) and f.seekable():
+                # is_zipfile leaves the stream at its end
+                start = f.tell()
+                is_zip = zipfile.is_zipfile(f)
+                f.seek(start)
+            else:
+                is_zip = False
+            if is_zip:
+                self.index_zip(f)
+            elif hasattr(f, 'peek') and f.peek(2)[:2] == GZIP_MAGIC:
+                with gzip.GzipFile(fileobj=f) as gz:
+                    self.index(gz)
+            else:
+                self.index(f)
+        elif zipfile.is_zipfile(self.infile):
+            self.index_zip(self.infile)
+        elif str(self.infile).endswith('.gz'):
+            with gzip.open(self.infile, 'rb') as f:
+                self.index(f)
+        else:
+            with open(self.infile, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    # the mapping outlives the file object
+                    self.index_mmap(mmap.mmap(f.fileno(), 0,
+                                              access=mmap.ACCESS_READ))
+                else:
+                    # empty files cannot be mapped
+                    self.index(f)
+
+    def index_zip(self, source):
+        """Index module sections from the data member of a FastQC zip archive.
+
+        :param source: path or seekable binary file object of the archive
+        :type source: str or io.BufferedIOBase
+        :return: None
+        :rtype: None
+        """
+        with zipfile.ZipFile(source) as zf:
+            member = find_data_member(zf)
+            with zf.open(member) as f:
+                if member.endswith('.gz'):
+                    with gzip.open(f) as gz:
+                        self.index(gz)
+                else:
+                    self.index(f)
+
+    def index(self, f):
+        """Index module sections from an open file object, handing each
+        section to its consumer once its '>>END_MODULE' line has been read.
+
+        :param f: binary or text file object positioned at the start of the
+            data
+        :type f: io.IOBase
+        :return: None
+        :rtype: None
+        """
+        section = None
+        offset = 0
+        for lineno, raw in enumerate(f):
+            if isinstance(raw, bytes):
+                line = raw.decode()
+            else:
+                line, raw = raw, raw.encode()
+            if section is None:
+                if line.startswith('>>') and not line.startswith('>>END'):
+                    fields = line[2:].rstrip('\n').split('\t')
+                    status = fields[1] if len(fields) > 1 else ''
+                    section = Section(fields[0], status, offset, lineno,
+                                      None, [line])
+            elif line.startswith('>>END'):
+                section.end = lineno
+                self.add(section)
+                section = None
+            else:
+                section.lines.append(line)
+            offset += len(raw)
+
+    def index_mmap(self, buffer):
+        """Index module sections of a memory-mapped file by searching for the
+        '>>' lines that delimit them, handing each section to its consumer
+        as a zero-copy view of its bytes.
+
+        :param buffer: memory-mapped FastQC data
+        :type buffer: mmap.mmap
+        :return: None
+        :rtype: None
+        """
+        view = memoryview(buffer)
+        size = len(buffer)
+        section = None
+        pos = lineno = 0
+        while pos < size:
+            # start of the next line beginning with '>>'
+            if buffer[pos:pos + 2] == b'>>':
+                marker = pos
+            else:
+                marker = buffer.find(b'\n>>', pos)
+                if marker < 0:
+                    break
+                marker += 1
+            lineno += view[pos:marker].tobytes().count(b'\n')
+            newline = buffer.find(b'\n', marker)
+            pos = size if newline < 0 else newline + 1
+            line = buffer[marker:pos].decode()
+            if section is None:
+                if not line.startswith('>>END'):
+                    fields = line[2:].rstrip('\n').split('\t')
+                    status = fields[1] if len(fields) > 1 else ''
+                    section = Section(fields[0], status, marker, lineno,
+                                      None)
+            elif line.startswith('>>END'):
+                section.end = lineno
+                section.data = view[section.offset:marker]
+                self.add(section)
+                section = None
+            lineno += 1
+
+    def add(self, section):
+        """Record a complete module section and call its consumer.
+
+        :param section: module section
+        :type section: Section
+        :return: None
+        :rtype: None
+        """
+        self.sections[section.name] = section
+        consumer = self.consumers.get(section.name)
+        if consumer is not None:
+            consumer(self)
+
+    def section(self, name):
+        """Return the section for a QC module.
+
+        :param name: QC module name
+        :type name: str
+        :return: section or None if the module is missing from the file
+        :rtype: Section
+        """
+        return self.sections.get(name)
+
+    def lines(self, name):
+        """Return a copy of the raw lines for a QC module.
+
+        :param name: QC module name
+        :type name: str
+        :return: module lines (empty if the module is missing)
+        :rtype: list
+        """
+        section = self.sections.get(name)
+        return list(section.lines) if section else []
+
+    def get_field(self, name, field):
+        """Return a value from a two-column module such as Basic Statistics.
+
+        :param name: QC module name
+        :type name: str
+        :param field: measure name in the first column
+        :type field: str
+        :return: value for the measure, or '' if not found
+        :rtype: str
+        """
+        for line in self.lines(name)[1:]:
+            measure, _, value = line.rstrip('\n').partition('\t')
+            if measure == field:
+                return value
+        return ''
+
+
+def decode_lines(data):
+    """Decode raw FastQC data into lines split at newlines only, as read
+    from a file.
+
+    :param data: raw data
+    :type data: bytes or memoryview
+    :return: lines, each with its newline
+    :rtype: list
+    """
+    return io.StringIO(bytes(data).decode(), newline='\n').readlines()
+
+
+def is_stream(infile):
+    """Check whether input is standard input or a file-like object rather
+    than a file path.
+
+    :param infile: input FastQC file, '-' or a file-like object
+    :type infile: str or file-like object
+    :return: True if the input can only be read once
+    :rtype: bool
+    """
+    return infile == STDIN or hasattr(infile, 'read')
+
+
+def find_data_member(zf):
+    """Find the fastqc_data.txt (or fastqc_data.txt.gz) member of a FastQC zip
+    archive.
+
+    :param zf: open FastQC zip archive
+    :type zf: zipfile.ZipFile
+    :return: name of the data member
+    :rtype: str
+    :raises: FormatError: if the archive holds no FastQC data member
+    """
+    names = zf.namelist()
+    for suffix in (DATA_MEMBER, DATA_MEMBER + '.gz'):
+        for name in names:
+            if name == suffix or name.endswith('/' + suffix):
+                return name
+    raise FormatError(f'No {DATA_MEMBER} found in {zf.filename}.')
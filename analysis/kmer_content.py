@@ -1,12 +1,14 @@
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
 
 
 class KmerContent(Module):
@@ -14,62 +16,73 @@ class KmerContent(Module):
 
     KmerContent is a subclass of Module class from QCModule and inherits clean_line
     """
+    # types of the columns in the module table
+    dtypes = (str, int, float, float, int)
 
-    def __init__(self, fastqc, outdir):
+    def __init__(self, fastqc, outdir, **kwargs):
         """Constructor for KmerContent object
 
         :param fastqc: FastQC input file
         :type fastqc: str
         :param outdir: output directory
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(fastqc, outdir)
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Kmer Content'
 
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df: pandas dataframe containing data for plotting.
         :rtype: pandas.DataFrame
-        :raises: ValueError: module data not in FastQC format.
+        :raises: FormatError: module data not in FastQC format.
         """
         try:
-            lines, columns = self.clean_lines()
-            data = [(line[0], int(line[1]), float(line[2]), float(line[3]),
-                     int(line[4])) for line in lines[2:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['Max Obs/Exp Position']
             # sort by count descending order and subset top 6 most freq sequences
             df = df.sort_values(by='Count', ascending=False)[:6]
             df = df.sort_index()
             return df
 
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
+
+        :return: None
+        :rtype: None
+        """
+        sns.set_style()
+
     def create_graph(self):
-        """Plot graph for K-mer content and save as PNG file.
+        """Plot graph for K-mer content and save to the graph file.
 
         :return: None
         :rtype: None
         """
         df = self.prep_data()
         # plot data
-        sns.set_style()
-        fig, ax = plt.subplots(1, 1)
+        self.set_style()
+        fig = Figure()
+        ax = fig.subplots(1, 1)
         # if each kmer is found only at a single position
         # i.e. 1 entry per sequence plot as a bar plot, otherwise
         # plot a line plot
         if df['Sequence'].unique().size == df['Sequence'].size:
             sns.barplot(x=df['Max Obs/Exp Position'], y=df['Obs/Exp Max'],
-                        hue=df['Sequence'])
+                        hue=df['Sequence'], ax=ax)
         else:
-            sns.lineplot(x=df['Max Obs/Exp Position'], y=df['Obs/Exp Max'],
-                         hue=df['Sequence'])
+            plotting.lineplot(ax, x=df['Max Obs/Exp Position'],
+                              y=df['Obs/Exp Max'], hue=df['Sequence'])
         ax.set_title('Relative enrichment over read length')
         ax.legend(loc='best', facecolor='white')
-        plt.yticks(np.arange(0, 101, 10))
+        ax.set_yticks(np.arange(0, 101, 10))
         ax.set_xlabel('Position in read (bp)')
         ax.set_ylabel('')
 
@@ -80,10 +93,8 @@ class KmerContent(Module):
         # hide top axis
         ax.spines['top'].set_visible(False)
         # save figure
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+        self.save_graph(fig)
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for K-mer content analysis.
@@ -92,8 +103,10 @@ class KmerContent(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -0,0 +1,336 @@
+"""This module provides the output backends QC modules write their report,
+filter and graph files through.
+
+DirectoryOutput keeps the default layout of one subdirectory per module in
+the output directory. ArchiveOutput writes the same files as members of a
+single zip or tar archive per sample instead. Each member is streamed to the
+archive as soon as it is written, and the archive is moved into place when it
+is closed. This replaces the directory and file creations of every module
+with a single file, which matters on file systems where metadata operations
+cost more than the data, e.g. Lustre or NFS.
+"""
+import contextlib
+import io
+import logging
+import os
+import tarfile
+import threading
+import time
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# output layouts selectable on the command line
+OUTPUT_FORMATS = ('dir', 'zip', 'tar')
+
+
+class DirectoryOutput:
+    """Writes module outputs as files in a directory per module."""
+    # outputs are checked and skipped per module through the manifest
+    incremental = True
+
+    def prepare(self):
+        """Module directories are checked one at a time by the modules.
+
+        :return: True
+        :rtype: bool
+        """
+        return True
+
+    def exists(self, path):
+        """Check whether a module directory exists.
+
+        :param path: module directory
+        :type path: str
+        :return: True if it exists
+        :rtype: bool
+        """
+        return os.path.exists(path)
+
+    def makedirs(self, path):
+        """Create a module directory.
+
+        :param path: module directory
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+        os.makedirs(path)
+
+    def open(self, path):
+        """Open an output file for writing.
+
+        :param path: output file
+        :type path: str
+        :return: binary file
+        :rtype: io.BufferedWriter
+        """
+        return open(path, 'wb')
+
+    def write(self, path, data):
+        """Write an output file.
+
+        :param path: output file
+        :type path: str
+        :param data: file content
+        :type data: bytes
+        :return: None
+        :rtype: None
+        """
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def collected(self):
+        """Return the files written in a render worker that still have to be
+        written by the parent process; files are written directly here.
+
+        :return: (path, data) pairs
+        :rtype: list
+        """
+        return []
+
+    def close(self):
+        """Finish writing the outputs.
+
+        :return: None
+        :rtype: None
+        """
+
+    def abort(self):
+        """Files already written are kept, as when a module fails.
+
+        :return: None
+        :rtype: None
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ArchiveOutput:
+    """Writes the module outputs of one sample as members of a single zip or
+    tar archive named after the output directory, e.g. outdir.zip, with the
+    same paths as in the directory layout.
+
+    Members are streamed to a temporary file which is renamed to the
+    archive on close, so an interrupted run never leaves a partial archive.
+    A copy sent to a render worker collects the graphs it writes, which the
+    parent process then adds with write().
+    """
+    incremental = False
+
+    def __init__(self, outdir, fmt='zip', infile=None, on_exists='ask'):
+        """Constructor for ArchiveOutput objects.
+
+        :param outdir: output directory the archive stands in for
+        :type outdir: str
+        :param fmt: archive format, 'zip' or 'tar'
+        :type fmt: str
+        :param infile: input FastQC file, used by the 'skip' policy
+        :type infile: str
+        :param on_exists: what to do if the archive exists, as for module
+            directories: 'ask', 'overwrite', 'skip' or 'fail'
+        :type on_exists: str
+        :raises: ValueError: if the archive format is not supported
+        """
+        if fmt not in ('zip', 'tar'):
+            raise ValueError(f'Unknown archive format "{fmt}".')
+        self.outdir = outdir
+        self.fmt = fmt
+        self.path = f'{os.path.normpath(outdir)}.{fmt}'
+        self.infile = infile
+        self.on_exists = on_exists
+        self.archive = None
+        # files collected by a copy in a render worker, None in the parent
+        self.pending = None
+        # reports and graphs may be written from several threads
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        """Detach a copy sent to a render worker from the open archive.
+
+        :return: picklable object state
+        :rtype: dict
+        """
+        state = self.__dict__.copy()
+        state['archive'] = None
+        state['lock'] = None
+        state['pending'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @property
+    def tmp(self):
+        """Temporary file the archive is streamed to."""
+        return self.path + '.part'
+
+    def prepare(self):
+        """Check the archive can be written under the on_exists policy and
+        start writing it.
+
+        :return: True if the archive should be written, False to skip it
+            because it is newer than the input file
+        :rtype: bool
+        :raises: OutputExistsError: if the archive exists and may not be
+            overwritten
+        """
+        if os.path.exists(self.path) and not self.may_overwrite():
+            return False
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if self.fmt == 'zip':
+            self.archive = zipfile.ZipFile(self.tmp, 'w',
+                                           zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = tarfile.open(self.tmp, 'w')
+        return True
+
+    def may_overwrite(self):
+        """Apply the on_exists policy to an existing archive.
+
+        :return: True to overwrite the archive, False to skip it
+        :rtype: bool
+        :raises: OutputExistsError: if the archive may not be overwritten
+        """
+        # imported here, qc_module imports this module
+        from analysis.qc_module import may_overwrite, outputs_newer
+
+        return may_overwrite(
+            self.path, self.on_exists,
+            lambda: (self.on_exists == 'skip'
+                     and outputs_newer([self.path], self.infile)))
+
+    def member(self, path):
+        """Return the archive member name of an output file.
+
+        :param path: output file in the directory layout
+        :type path: str
+        :return: member name relative to the output directory
+        :rtype: str
+        """
+        return os.path.relpath(path, self.outdir).replace(os.sep, '/')
+
+    def exists(self, path):
+        """Module directories never exist in an archive being written.
+
+        :param path: module directory
+        :type path: str
+        :return: False
+        :rtype: bool
+        """
+        return False
+
+    def makedirs(self, path):
+        """Directories are implied by member names.
+
+        :param path: module directory
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+
+    @contextlib.contextmanager
+    def open(self, path):
+        """Open an output file for writing, added to the archive once it is
+        closed.
+
+        :param path: output file
+        :type path: str
+        :return: binary buffer
+        :rtype: io.BytesIO
+        """
+        buffer = io.BytesIO()
+        yield buffer
+        self.write(path, buffer.getvalue())
+
+    def write(self, path, data):
+        """Add an output file to the archive.
+
+        :param path: output file
+        :type path: str
+        :param data: file content
+        :type data: bytes
+        :return: None
+        :rtype: None
+        """
+        data = bytes(data)
+        if self.pending is not None:
+            self.pending.append((path, data))
+            return
+        name = self.member(path)
+        with self.lock:
+            if self.fmt == 'zip':
+                self.archive.writestr(name, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                self.archive.addfile(info, io.BytesIO(data))
+
+    def collected(self):
+        """Return the files written by a copy in a render worker.
+
+        :return: (path, data) pairs
+        :rtype: list
+        """
+        pending, self.pending = self.pending or [], []
+        return pending
+
+    def close(self):
+        """Finish the archive and move it into place.
+
+        :return: None
+        :rtype: None
+        """
+        if self.archive is None:
+            return
+        self.archive.close()
+        self.archive = None
+        os.replace(self.tmp, self.path)
+        logger.info(f'Module outputs written to {self.path}.')
+
+    def abort(self):
+        """Discard a partly written archive.
+
+        :return: None
+        :rtype: None
+        """
+        if self.archive is None:
+            return
+        self.archive.close()
+        self.archive = None
+        os.remove(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def create_output(fmt, outdir, infile=None, on_exists='ask'):
+    """Create the output backend for the module outputs of one sample.
+
+    :param fmt: 'dir', 'zip' or 'tar'
+    :type fmt: str
+    :param outdir: output directory of the sample
+    :type outdir: str
+    :param infile: input FastQC file
+    :type infile: str
+    :param on_exists: policy applied to an existing archive
+    :type on_exists: str
+    :return: output backend
+    :rtype: DirectoryOutput or ArchiveOutput
+    :raises: ValueError: if the output format is not supported
+    """
+    if fmt == 'dir':
+        return DirectoryOutput()
+    return ArchiveOutput(outdir, fmt, infile=infile, on_exists=on_exists)
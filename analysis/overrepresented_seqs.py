@@ -1,13 +1,21 @@
 """This module contains functionality for generating reports from
  Overrepresented sequence data from FastQC files.
 """
+import logging
+
 from analysis.qc_module import Module
 
+logger = logging.getLogger(__name__)
+
 
 class OverrepresentedSeqs(Module):
     """Class for analysing Overrepresented Sequences module data from FastQC"""
+    # types of the columns in the module table
+    dtypes = (str, int, float, str)
+    # module has no graph
+    outputs = ('QC_report.txt', 'filter.txt')
 
-    def __init__(self, fastqc, outdir):
+    def __init__(self, fastqc, outdir, **kwargs):
         """Constructor for overrepresented sequence objects
 
         :keyword: name: module name set to "Overrepresented sequences"
@@ -15,8 +23,10 @@ class OverrepresentedSeqs(Module):
         :type fastqc:
         :param outdir:
         :type outdir:
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(fastqc, outdir)
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Overrepresented sequences'
 
     def module_output(self):
@@ -26,7 +36,9 @@ class OverrepresentedSeqs(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        print('Completed.\n' + '-' * 80)
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -0,0 +1,265 @@
+"""This module provides an asyncio pipeline for batch runs which overlaps
+reading the next FastQC files with drawing the graphs of the current ones.
+
+Input files are read and indexed on a thread pool, a few files ahead of the
+renderer, and handed on through a bounded queue; graphs are built and saved on
+a process pool while report and filter files are written on the thread pool.
+Only the files being read, queued or rendered are held in memory, however many
+files the batch holds.
+"""
+import asyncio
+import collections
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import matplotlib
+
+from analysis.exceptions import FastQCError
+from analysis.fastqc_file import FastQCFile
+from analysis.output import create_output
+from analysis.qc_module import unattended
+from analysis.render import init_worker, render, style_params
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """Batch pipeline generating the output of QC modules for many FastQC
+    files.
+
+    Use as a context manager, which starts and shuts down the worker pools.
+    """
+
+    def __init__(self, classes, jobs=None, prefetch=2, output_format='dir',
+                 **options):
+        """Constructor for Pipeline objects.
+
+        :param classes: QC module classes to run on each file, each with its
+            module-specific constructor options
+        :type classes: list(tuple(type, dict))
+        :param jobs: number of worker processes rendering graphs
+        :type jobs: int
+        :param prefetch: number of files read ahead of the renderer, which
+            is also the number of files rendered at once
+        :type prefetch: int
+        :param output_format: output layout of each file: 'dir', 'zip' or
+            'tar'
+        :type output_format: str
+        :param options: options passed on to every module constructor, e.g.
+            on_exists and graph_format; the pipeline never prompts, so 'ask'
+            is applied as for batch workers (see qc_module.unattended)
+        """
+        self.classes = classes
+        self.jobs = jobs or os.cpu_count()
+        self.prefetch = max(1, prefetch)
+        self.output_format = output_format
+        self.options = dict(options, on_exists=unattended(
+            options.get('on_exists', 'ask')))
+        self.render_pool = None
+        self.io_pool = None
+
+    def __enter__(self):
+        self.render_pool = ProcessPoolExecutor(max_workers=self.jobs,
+                                               initializer=init_worker)
+        # start the workers before any thread does: a worker forked while a
+        # thread holds an import lock deadlocks on its first import
+        self.render_pool.submit(int).result()
+        self.io_pool = ThreadPoolExecutor(
+            max_workers=max(4, self.prefetch * 2),
+            thread_name_prefix='pipeline-io')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.render_pool.shutdown()
+        self.io_pool.shutdown()
+        self.render_pool = self.io_pool = None
+
+    async def read(self, inputs, queue):
+        """Read the input files, up to `prefetch` at once, and queue them in
+        input order.
+
+        :param inputs: output directory keyed by input file
+        :type inputs: dict
+        :param queue: bounded queue of (infile, outdir, fastqc, error, start)
+            items, ended by None
+        :type queue: asyncio.Queue
+        :return: None
+        :rtype: None
+        """
+        loop = asyncio.get_running_loop()
+        pending = collections.deque()
+
+        async def put_next():
+            infile, outdir, start, future = pending.popleft()
+            try:
+                fastqc, error = await future, None
+            except Exception as e:
+                # any error, e.g. a file that is not UTF-8, only fails the
+                # file it came from
+                fastqc, error = None, e
+            await queue.put((infile, outdir, fastqc, error, start))
+
+        try:
+            for infile, outdir in inputs.items():
+                pending.append((infile, outdir, time.perf_counter(),
+                                loop.run_in_executor(self.io_pool, FastQCFile,
+                                                     infile)))
+                if len(pending) >= self.prefetch:
+                    await put_next()
+            while pending:
+                await put_next()
+        finally:
+            # run() waits for the end of the queue, even if reading failed
+            await queue.put(None)
+
+    async def run_module(self, module, rc):
+        """Generate the output of one QC module: its directory, report and
+        filter files are written on the thread pool and its graph is drawn on
+        the process pool.
+
+        :param module: QC module
+        :type module: analysis.qc_module.Module
+        :param rc: rcParams to draw the graph with, see style_params
+        :type rc: dict
+        :return: None
+        :rtype: None
+        :raises: FastQCError: if the module is missing from the input, is not
+            in FastQC format or its directory may not be overwritten
+        """
+        loop = asyncio.get_running_loop()
+        module.parse_text()
+        if not await loop.run_in_executor(self.io_pool, module.make_dir):
+            return
+        try:
+            # the report comes first so that data it prepares, e.g. the per
+            # tile pivot table, is sent to the render worker with the module
+            await loop.run_in_executor(self.io_pool, module.create_report)
+            tasks = [loop.run_in_executor(self.io_pool,
+                                          module.create_filter_text)]
+            if hasattr(module, 'create_graph'):
+                tasks.append(loop.run_in_executor(
+                    self.render_pool, render, module, rc))
+            results = await asyncio.gather(*tasks)
+            if len(results) > 1:
+                # graphs an archive could not take from the worker
+                for path, data in results[1]:
+                    await loop.run_in_executor(self.io_pool,
+                                               module.output.write, path, data)
+        except BaseException:
+            module.forget_manifest()
+            raise
+        # manifests are only updated from the event loop, one at a time
+        module.update_manifest()
+
+    async def run_file(self, infile, outdir, fastqc):
+        """Generate the output of every QC module for one FastQC file.
+
+        :param infile: input FastQC file
+        :type infile: str
+        :param outdir: output directory of the file
+        :type outdir: str
+        :param fastqc: parsed input file
+        :type fastqc: analysis.fastqc_file.FastQCFile
+        :return: True if every module succeeded
+        :rtype: bool
+        :raises: OutputExistsError: if the archive of the file may not be
+            overwritten
+        """
+        loop = asyncio.get_running_loop()
+        output = create_output(self.output_format, outdir, infile,
+                               self.options['on_exists'])
+        if not await loop.run_in_executor(self.io_pool, output.prepare):
+            return True
+        modules = [module_class(fastqc, outdir, output=output,
+                                **dict(self.options, **kwargs))
+                   for module_class, kwargs in self.classes]
+        # styles are applied in module order from the default style, as when
+        # a batch worker draws the modules of a file one after another,
+        # however the modules interleave below
+        matplotlib.rcdefaults()
+        styles = [style_params(module) if hasattr(module, 'create_graph')
+                  else None for module in modules]
+        results = await asyncio.gather(
+            *(self.run_module(module, rc)
+              for module, rc in zip(modules, styles)),
+            return_exceptions=True)
+        success = True
+        for module, result in zip(modules, results):
+            if isinstance(result, BaseException):
+                logger.error(f'{infile}: {module.name}: {result}')
+                success = False
+        # an archive is only moved into place if every module succeeded
+        await loop.run_in_executor(
+            self.io_pool, output.close if success else output.abort)
+        return success
+
+    async def run(self, inputs, callback=None):
+        """Run the QC modules over every input file.
+
+        :param inputs: output directory keyed by input file
+        :type inputs: dict
+        :param callback: called with the input file, success flag and
+            elapsed seconds as each file completes
+        :type callback: function
+        :return: input files that failed
+        :rtype: list
+        """
+        queue = asyncio.Queue(maxsize=self.prefetch)
+        reader = asyncio.create_task(self.read(inputs, queue))
+        # files being rendered, bounding memory together with the queue
+        slots = asyncio.Semaphore(self.prefetch)
+        failed = []
+
+        async def process(infile, outdir, fastqc, error, start):
+            try:
+                if error is not None:
+                    logger.error(f'{infile}: {error}')
+                    success = False
+                else:
+                    success = await self.run_file(infile, outdir, fastqc)
+            except FastQCError as e:
+                logger.error(f'{infile}: {e}')
+                success = False
+            finally:
+                slots.release()
+            if not success:
+                failed.append(infile)
+            if callback is not None:
+                callback(infile, success, time.perf_counter() - start)
+
+        tasks = set()
+        while (item := await queue.get()) is not None:
+            await slots.acquire()
+            task = asyncio.create_task(process(*item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(reader, *tasks)
+        return failed
+
+
+def run_pipeline(inputs, classes, jobs=None, prefetch=2, output_format='dir',
+                 callback=None, **options):
+    """Run QC modules over many FastQC files through a Pipeline.
+
+    :param inputs: output directory keyed by input file
+    :type inputs: dict
+    :param classes: QC module classes with their module-specific options
+    :type classes: list(tuple(type, dict))
+    :param jobs: number of worker processes rendering graphs
+    :type jobs: int
+    :param prefetch: number of files read ahead of the renderer
+    :type prefetch: int
+    :param output_format: output layout of each file: 'dir', 'zip' or 'tar'
+    :type output_format: str
+    :param callback: called with the input file, success flag and elapsed
+        seconds as each file completes
+    :type callback: function
+    :param options: options passed on to every module constructor
+    :return: input files that failed
+    :rtype: list
+    """
+    with Pipeline(classes, jobs=jobs, prefetch=prefetch,
+                  output_format=output_format, **options) as pipe:
+        return asyncio.run(pipe.run(inputs, callback))
@@ -0,0 +1,68 @@
+"""This module provides lightweight plotting helpers shared by the QC module
+graphs in the analysis package.
+
+FastQC tables hold a single value per x position, so series are drawn
+directly with matplotlib's Axes.plot rather than seaborn's lineplot, which
+groups, aggregates and bootstraps confidence intervals for every call.
+"""
+
+
+def lineplot(ax, x, y, hue=None, label=None, color=None, **kwargs):
+    """Draw one line per series on an axes.
+
+    Like seaborn's lineplot, axis labels are taken from the names of x and y
+    if the axes has none yet, and a legend is added for labelled lines.
+
+    :param ax: axes to draw on
+    :type ax: matplotlib.axes.Axes
+    :param x: x values
+    :type x: pandas.Series or array-like
+    :param y: y values
+    :type y: pandas.Series or array-like
+    :param hue: optional grouping values, one line is drawn per group
+    :type hue: pandas.Series or array-like
+    :param label: legend label of the line
+    :type label: str
+    :param color: line colour
+    :type color: str
+    :param kwargs: other keyword arguments passed on to Axes.plot
+    :return: lines added to the axes
+    :rtype: list
+    """
+    lines = []
+    xname, yname = getattr(x, 'name', None), getattr(y, 'name', None)
+    if hue is None:
+        lines += ax.plot(x, y, label=label, color=color, **kwargs)
+    else:
+        x, y, hue = list(x), list(y), list(hue)
+        # one line per group, in order of first appearance
+        for group in dict.fromkeys(hue):
+            rows = [i for i, value in enumerate(hue) if value == group]
+            lines += ax.plot([x[i] for i in rows], [y[i] for i in rows],
+                             label=group, color=color, **kwargs)
+    if not ax.get_xlabel() and xname:
+        ax.set_xlabel(xname)
+    if not ax.get_ylabel() and yname:
+        ax.set_ylabel(yname)
+    if label is not None or hue is not None:
+        ax.legend()
+    return lines
+
+
+def set_ydata(ax, lines, ys):
+    """Replace the y values of lines drawn on an axes, rescaling the axes
+    limits that are autoscaled to the new values.
+
+    :param ax: axes the lines are drawn on
+    :type ax: matplotlib.axes.Axes
+    :param lines: lines to update
+    :type lines: list
+    :param ys: new y values of each line
+    :type ys: list
+    :return: None
+    :rtype: None
+    """
+    for line, y in zip(lines, ys):
+        line.set_ydata(y)
+    ax.relim()
+    ax.autoscale_view()
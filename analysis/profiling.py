@@ -0,0 +1,176 @@
+"""This module provides per-module instrumentation of QC module output: wall
+time and peak traced memory of each stage (parse, prep_data, create_graph,
+savefig and report) of every module run through a Profiler.
+
+Stages nest, e.g. savefig runs inside create_graph; each stage's wall time
+excludes the stages nested in it, while a module's total includes them all.
+Peak memory is the highest tracemalloc reading above the memory in use when
+the stage started.
+"""
+import contextlib
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+
+# file the results are written to in the output directory
+PROFILE_FILE = 'profile.json'
+# cProfile statistics of the slowest module, readable with pstats
+CPROFILE_FILE = 'profile.prof'
+
+
+class Profiler:
+    """Collects stage timings and memory peaks of QC modules."""
+
+    def __init__(self, memory=True, cprofile=False):
+        """Constructor for Profiler objects.
+
+        :param memory: trace memory allocations with tracemalloc
+        :type memory: bool
+        :param cprofile: also run each module under cProfile and keep the
+            statistics of the slowest one
+        :type cprofile: bool
+        """
+        self.memory = memory
+        self.cprofile = cprofile
+        self.results = {}
+        self.profiles = {}
+        self.stack = []
+        self.tracing = False
+
+    def record(self, name, stage=None):
+        """Return the record of a module, or of one of its stages.
+
+        :param name: QC module name
+        :type name: str
+        :param stage: stage name, or None for the whole module
+        :type stage: str
+        :return: record with wall_s, peak_bytes and calls
+        :rtype: dict
+        """
+        module = self.results.setdefault(
+            name, dict(wall_s=0.0, peak_bytes=0, calls=0, stages={}))
+        if stage is None:
+            return module
+        return module['stages'].setdefault(
+            stage, dict(wall_s=0.0, peak_bytes=0, calls=0))
+
+    @contextlib.contextmanager
+    def stage(self, name, stage=None):
+        """Measure a stage of a QC module.
+
+        :param name: QC module name
+        :type name: str
+        :param stage: stage name, or None to measure the whole module
+        :type stage: str
+        :return: context manager
+        :rtype: contextlib.AbstractContextManager
+        """
+        tracing = tracemalloc.is_tracing()
+        frame = dict(child_s=0.0, base=0, peak=0)
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                # keep the enclosing stage's peak before restarting it
+                parent = self.stack[-1]
+                parent['peak'] = max(parent['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['base'] = frame['peak'] = current
+        self.stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stack.pop()
+            if tracing:
+                frame['peak'] = max(frame['peak'],
+                                    tracemalloc.get_traced_memory()[1])
+            record = self.record(name, stage)
+            record['wall_s'] += (elapsed if stage is None
+                                 else elapsed - frame['child_s'])
+            record['peak_bytes'] = max(record['peak_bytes'],
+                                       frame['peak'] - frame['base'])
+            record['calls'] += 1
+            if self.stack:
+                parent = self.stack[-1]
+                parent['child_s'] += elapsed
+                parent['peak'] = max(parent['peak'], frame['peak'])
+
+    def run(self, module):
+        """Generate all output of a QC module while measuring it.
+
+        :param module: QC module created with this profiler
+        :type module: analysis.qc_module.Module
+        :return: None
+        :rtype: None
+        """
+        self.start()
+        profile = cProfile.Profile() if self.cprofile else None
+        # the name is only known once the subclass constructor has run
+        with self.stage(module.name):
+            if profile is not None:
+                profile.enable()
+            try:
+                module.module_output()
+            finally:
+                if profile is not None:
+                    profile.disable()
+                    self.profiles[module.name] = profile
+
+    def start(self):
+        """Start tracing memory allocations, unless already tracing.
+
+        :return: None
+        :rtype: None
+        """
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+    def stop(self):
+        """Stop tracing memory allocations if this profiler started it.
+
+        :return: None
+        :rtype: None
+        """
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def hottest(self):
+        """Name of the module with the longest wall time.
+
+        :return: module name, or None if no module has been run
+        :rtype: str
+        """
+        if not self.results:
+            return None
+        return max(self.results,
+                   key=lambda name: self.results[name]['wall_s'])
+
+    def write(self, outdir, infile=None):
+        """Write the results, and the cProfile statistics of the slowest
+        module if collected, to the output directory.
+
+        :param outdir: output directory
+        :type outdir: str
+        :param infile: input FastQC file recorded with the results
+        :type infile: str
+        :return: path of the results file
+        :rtype: str
+        """
+        os.makedirs(outdir, exist_ok=True)
+        hottest = self.hottest()
+        report = dict(input=infile if isinstance(infile, str) else None,
+                      memory=self.memory, hottest=hottest,
+                      modules=self.results)
+        if hottest in self.profiles:
+            self.profiles[hottest].dump_stats(
+                os.path.join(outdir, CPROFILE_FILE))
+            report['cprofile'] = CPROFILE_FILE
+        path = os.path.join(outdir, PROFILE_FILE)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return path
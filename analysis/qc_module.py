@@ -1,82 +1,446 @@
 """This module provides generic I/O functionality for all FastQC module
 subclasses in the analysis package."""
+import collections
+import contextlib
+import csv
+import functools
+import hashlib
+import io
+import json
+import logging
 import os
 import sys
 from abc import ABC, abstractmethod
 
+from analysis.exceptions import (FormatError, ModuleMissingError,
+                                 OutputExistsError)
+from analysis.fastqc_file import STDIN, FastQCFile, is_stream
+from analysis.output import DirectoryOutput
+
+logger = logging.getLogger(__name__)
+
+
+# policies for a module directory that already exists in the output directory
+ON_EXISTS = ('ask', 'overwrite', 'skip', 'fail')
+# bump whenever report or graph output changes so existing outputs are redrawn
+RENDERER_VERSION = '3'
+# manifest of module section hashes kept in the output directory
+MANIFEST = 'manifest.json'
+# graph file formats supported by matplotlib's savefig
+GRAPH_FORMATS = ('png', 'svg', 'pdf', 'webp')
+# figures built by template renderers and kept for reuse by later graphs with
+# the same layout, keyed by module class and layout, most recently used last
+TEMPLATES = collections.OrderedDict()
+# most figures kept in TEMPLATES per process
+MAX_TEMPLATES = 16
+
+
+def unattended(on_exists):
+    """Return the on_exists policy to use where the user cannot be asked,
+    e.g. in batch workers and service jobs: 'ask' becomes 'fail', which
+    still skips modules whose outputs are up to date.
+
+    :param on_exists: on_exists policy
+    :type on_exists: str
+    :return: policy that never prompts
+    :rtype: str
+    """
+    return 'fail' if on_exists == 'ask' else on_exists
+
+
+def outputs_newer(paths, infile):
+    """Check whether existing output files are at least as new as the input
+    file they were generated from, as used by the 'skip' policy.
+
+    :param paths: existing output files
+    :type paths: list
+    :param infile: input FastQC file
+    :type infile: str
+    :return: True if no output is older than the input, or the input has no
+        modification time, e.g. a stream
+    :rtype: bool
+    """
+    try:
+        source_time = os.path.getmtime(infile)
+    except (OSError, TypeError):
+        # input without a modification time, e.g. a stream
+        return True
+    return min(os.path.getmtime(path) for path in paths) >= source_time
+
+
+def may_overwrite(target, on_exists, up_to_date):
+    """Apply the on_exists policy to outputs that already exist, e.g. a
+    module directory, an archive or a combined report.
+
+    Outputs that are up to date are skipped under every policy but
+    'overwrite'; otherwise 'fail' raises, 'skip' regenerates them and 'ask'
+    prompts the user when run interactively and fails otherwise.
+
+    :param target: existing outputs, as named in messages
+    :type target: str
+    :param on_exists: 'ask', 'overwrite', 'skip' or 'fail'
+    :type on_exists: str
+    :param up_to_date: called to check whether the outputs are up to date
+    :type up_to_date: function
+    :return: True if the outputs should be generated, False to skip them
+    :rtype: bool
+    :raises: OutputExistsError: if the outputs may not be overwritten
+    """
+    if on_exists == 'overwrite':
+        return True
+    if up_to_date():
+        logger.info(f'{target} is up to date, skipping.')
+        return False
+    if on_exists == 'fail':
+        raise OutputExistsError(f'{target} exists in output directory.')
+    if on_exists == 'skip':
+        return True
+    if not sys.stdin.isatty():
+        # never block on input() when run without a terminal
+        raise OutputExistsError(
+            f'{target} exists in output directory '
+            f'(use --overwrite or --skip-existing).')
+    while True:
+        # warn user of potential file overwriting
+        answer = input(f'WARNING: {target} exists in output directory and '
+                       f'will be overwritten. Proceed (Y/N)? ')
+        if answer.lower() == 'y':
+            return True
+        elif answer.lower() == 'n':
+            raise OutputExistsError(f'{target} was not overwritten.')
+
+
+def profiled(stage):
+    """Decorator measuring a Module method as a stage of the module's
+    profiler, if it has one.
+
+    :param stage: stage name, e.g. 'prep_data'
+    :type stage: str
+    :return: decorator
+    :rtype: function
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.stage(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def read_manifest(outdir):
+    """Read the manifest of module section hashes from an output directory.
+
+    A manifest written by a different renderer version is ignored.
+
+    :param outdir: output directory
+    :type outdir: str
+    :return: mapping of module names to section hashes
+    :rtype: dict
+    """
+    try:
+        with open(os.path.join(outdir, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('renderer_version') != RENDERER_VERSION:
+        return {}
+    return manifest.get('modules', {})
+
+
+def write_manifest(outdir, modules):
+    """Atomically write the manifest of module section hashes.
+
+    :param outdir: output directory
+    :type outdir: str
+    :param modules: mapping of module names to section hashes
+    :type modules: dict
+    :return: None
+    :rtype: None
+    """
+    path = os.path.join(outdir, MANIFEST)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'renderer_version': RENDERER_VERSION, 'modules': modules},
+                  f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
 
 class Module(ABC):
     """Abstract class for a FastQC analysis module providing basic parsing and
     file I/O functionality for all FastQC modular analyses.
     """
+    # types of the columns in the module table, set by each subclass
+    dtypes = ()
+    # index in the module lines of the '#'-prefixed column names
+    header = 1
 
-    def __init__(self, infile, outdir):
+    def __init__(self, infile, outdir, scheduler=None, on_exists='ask',
+                 graph_format='png', dpi=300, tight=True, profiler=None,
+                 reuse_figures=False, output=None):
         """Constructor for generic Module object.
 
-        :param infile: input FastQC file
-        :type infile: str
+        :param infile: input FastQC file, or a FastQCFile parsed once and
+            shared between modules (required for standard input and
+            file-like objects, which can only be read once)
+        :type infile: str or FastQCFile
         :param outdir: output directory for generated reports and graphs
         :type outdir: str
+        :param scheduler: render scheduler for drawing graphs in worker
+            processes, graphs are drawn in-process if None
+        :type scheduler: analysis.render.RenderScheduler
+        :param on_exists: what to do if the module directory exists: 'ask'
+            the user, 'overwrite' it, 'skip' the module if its outputs are
+            up to date or 'fail'
+        :type on_exists: str
+        :param graph_format: graph file format (png, svg, pdf or webp)
+        :type graph_format: str
+        :param dpi: resolution of raster graphs in dots per inch
+        :type dpi: int
+        :param tight: crop graphs to their content with bbox_inches='tight'
+        :type tight: bool
+        :param profiler: profiler measuring the stages of the module output,
+            graphs are then drawn in-process
+        :type profiler: analysis.profiling.Profiler
+        :param reuse_figures: draw graphs with template renderers by updating
+            the figure built for an earlier graph with the same layout, e.g.
+            for the same module of an earlier sample in a batch
+        :type reuse_figures: bool
+        :param output: output backend shared by the modules of a sample, the
+            directory layout if None
+        :type output: analysis.output.DirectoryOutput or
+            analysis.output.ArchiveOutput
+        :raises: ValueError: if on_exists or graph_format is not supported
         """
+        if on_exists not in ON_EXISTS:
+            raise ValueError(f'Unknown on_exists policy "{on_exists}".')
+        if graph_format not in GRAPH_FORMATS:
+            raise ValueError(f'Unknown graph format "{graph_format}".')
+        # section of the module in the input, its lines are decoded from a
+        # memory-mapped section on first use
+        self.section = None
         self.lines = []
         self.name = ''
         self.dir_name = ''  # basic stats doesn't have this
-        self.infile = infile
+        if isinstance(infile, FastQCFile):
+            self.fastqc = infile
+            self.infile = infile.infile
+            # typed tables are cached alongside the file's section index
+            self.cache = infile.cache
+            self.cache_key = infile.key
+        else:
+            self.fastqc = None
+            self.infile = infile
+            self.cache = None
+            self.cache_key = None
         self.outdir = outdir
+        self.scheduler = scheduler
+        self.on_exists = on_exists
+        self.graph_format = graph_format
+        self.dpi = dpi
+        self.tight = tight
+        self.profiler = profiler
+        self.reuse_figures = reuse_figures
+        self.output = output if output is not None else DirectoryOutput()
+        # called with each graph figure instead of saving it to the graph
+        # file, e.g. to collect the figures of a combined report
+        self.graph_consumer = None
+
+    @property
+    def lines(self):
+        """Raw lines of the module section, header included."""
+        if self._lines is None:
+            self._lines = (list(self.section.lines)
+                           if self.section is not None else [])
+        return self._lines
+
+    @lines.setter
+    def lines(self, lines):
+        self._lines = lines
+
+    def head(self, count):
+        """Return the first lines of the module section, without decoding
+        the rest of a memory-mapped section.
+
+        :param count: number of lines
+        :type count: int
+        :return: lines
+        :rtype: list
+        """
+        if self._lines is None and self.section is not None:
+            return self.section.head(count)
+        return self.lines[:count]
+
+    def section_bytes(self, skip=0):
+        """Return the raw bytes of the module section after its first
+        lines, read from a memory-mapped section without decoding it.
+
+        :param skip: number of lines to leave out
+        :type skip: int
+        :return: raw bytes
+        :rtype: bytes or memoryview
+        """
+        if self._lines is None and self.section is not None:
+            return self.section.body(skip)
+        return ''.join(self.lines[skip:]).encode()
+
+    @property
+    def graph_file(self):
+        """Name of the graph file in the module directory."""
+        return f'graph.{self.graph_format}'
+
+    @property
+    def outputs(self):
+        """Names of the files written to the module directory."""
+        return 'QC_report.txt', 'filter.txt', self.graph_file
+
+    def __getstate__(self):
+        """Drop the shared parsed file and scheduler when a module is sent to
+        a render worker; the module's own lines are all it needs.
+
+        :return: picklable object state
+        :rtype: dict
+        """
+        state = self.__dict__.copy()
+        state['fastqc'] = None
+        state['scheduler'] = None
+        state['profiler'] = None
+        if is_stream(self.infile):
+            # a stream has been read already and cannot be sent
+            state['infile'] = STDIN
+        return state
 
+    def stage(self, name):
+        """Measure a stage of the module output with the module's profiler.
+
+        :param name: stage name
+        :type name: str
+        :return: context manager
+        :rtype: contextlib.AbstractContextManager
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(self.name, name)
+
+    @profiled('parse')
     def parse_text(self):
         """General parser for parsing FastQC Modules from input FastQC file.
 
         :return: None
         :rtype: None
-        :raises: ValueError: if the QC module is missing from input file.
-        """
-        with open(self.infile, 'r') as f:
-            for line in f:
-                if line.startswith(f'>>{self.name}'):
-                    self.lines.append(line)
-                    for modline in f:
-                        if not modline.startswith('>>END'):
-                            self.lines.append(modline)
-                        else:
-                            break
-        # check the module is in the file
-        try:
-            # if module is absent from file the lines attribute will be empty
-            if not len(self.lines):
-                raise ValueError
-        except ValueError:
-            print(f'Module "{self.name}" missing from input file.')
-            sys.exit(1)
+        :raises: ModuleMissingError: if the QC module is missing from input
+            file.
+        """
+        # parse the input file once, then take this module's slice
+        if self.fastqc is None:
+            self.fastqc = FastQCFile(self.infile)
+        self.section = self.fastqc.section(self.name)
+        # lines are only decoded once they are used
+        self.lines = None
+        if self.section is None:
+            raise ModuleMissingError(
+                f'Module "{self.name}" missing from input file.')
 
     def make_dir(self):
         """Create directory for the QC module in output directory.
 
-        :return: None
-        :rtype: None
+        If the directory already exists the on_exists policy decides whether
+        it is overwritten, skipped or treated as an error (see may_overwrite);
+        'fail' only fails on outputs that are out of date, so unattended
+        re-runs on unchanged input skip every module.
+
+        :return: True if module output should be generated, False to skip it
+        :rtype: bool
+        :raises: OutputExistsError: if the directory exists and may not be
+            overwritten
         """
         # remove whitespace from module dir name
         dir_name = self.name.replace(' ', '_')
         # append module dir name to outdir
         self.dir_name = os.path.join(self.outdir, dir_name)
         # check whether module directory exists
-        if not os.path.exists(self.dir_name):
+        if not self.output.exists(self.dir_name):
             # if it doesn't exist create new directory
-            os.makedirs(self.dir_name)
-        # if the module directory exists then exit the function ask user if
-        # they want to continue
-        else:
-            while True:
-                # warn user of potential file overwriting
-                answer = input(
-                    f'WARNING: {self.name} module directory exists in output '
-                    f'directory, any report files in the directory will be '
-                    f'overwritten. Proceed (Y/N)? ')
-                if answer.lower() == 'y':
-                    break
-                elif answer.lower() == 'n':
-                    sys.exit()
+            self.output.makedirs(self.dir_name)
+            return True
+        return may_overwrite(f'{self.name} module directory',
+                             self.on_exists, self.is_up_to_date)
+
+    def render_options(self):
+        """Options the module outputs depend on besides the section content.
+
+        Subclasses with options of their own extend this tuple so that
+        changing them regenerates the outputs.
+
+        :return: graph format, resolution and cropping
+        :rtype: tuple
+        """
+        return self.graph_format, self.dpi, self.tight
+
+    def content_hash(self):
+        """Hash the raw section lines of the module together with the
+        renderer version and render options.
 
+        :return: hex digest identifying the module output
+        :rtype: str
+        """
+        digest = hashlib.sha256(RENDERER_VERSION.encode())
+        # render options change the output as much as the section does
+        digest.update((':'.join(map(str, self.render_options())) + '\n')
+                      .encode())
+        # the same digest as hashing each line
+        digest.update(self.section_bytes())
+        return digest.hexdigest()
+
+    def is_up_to_date(self):
+        """Check whether all module outputs exist and were generated from the
+        same section content, according to the output directory manifest.
+
+        Outputs missing from the manifest are only considered up to date under
+        the 'skip' policy, when they are newer than the input file.
+
+        :return: True if the outputs are up to date
+        :rtype: bool
+        """
+        paths = [os.path.join(self.dir_name, name) for name in self.outputs]
+        if not all(os.path.exists(path) for path in paths):
+            return False
+        recorded = read_manifest(self.outdir).get(self.name)
+        if recorded is not None:
+            return recorded == self.content_hash()
+        return self.on_exists == 'skip' and outputs_newer(paths, self.infile)
+
+    @profiled('report')
+    def update_manifest(self):
+        """Record the section hash of the module in the output directory
+        manifest once its outputs have been generated.
+
+        Archives are written whole, so they keep no manifest.
+
+        :return: None
+        :rtype: None
+        """
+        if not self.output.incremental:
+            return
+        modules = read_manifest(self.outdir)
+        modules[self.name] = self.content_hash()
+        write_manifest(self.outdir, modules)
+
+    def forget_manifest(self):
+        """Drop the module from the output directory manifest when its
+        outputs could not be generated, so that it is regenerated on the next
+        run.
+
+        :return: None
+        :rtype: None
+        """
+        if not self.output.incremental:
+            return
+        modules = read_manifest(self.outdir)
+        if modules.pop(self.name, None) is not None:
+            write_manifest(self.outdir, modules)
+
+    @profiled('report')
     def create_report(self):
         """Generate report text file containing parsed lines for the QC module
         from input FastQC file.
@@ -85,11 +449,10 @@ class Module(ABC):
         :rtype: None
         """
         path = os.path.join(self.dir_name, 'QC_report.txt')
-        with open(path, 'w') as f:
-            lines = ''.join(self.lines)
-            f.write(lines)
-            print(f'Report text file generated for {self.name}.')
+        self.output.write(path, self.section_bytes())
+        logger.info(f'Report text file generated for {self.name}.')
 
+    @profiled('report')
     def create_filter_text(self):
         """Create filter text file from parsed QC module.
 
@@ -102,10 +465,9 @@ class Module(ABC):
         path = os.path.join(self.dir_name, 'filter.txt')
         # split the header line for module and extract the filter info
         # (second element)
-        filter_info = self.lines[0].split('\t')[1]
-        with open(path, 'w') as f:
-            f.write(filter_info)
-            print(f'Filter text file generated for {self.name}.')
+        filter_info = self.head(1)[0].split('\t')[1]
+        self.output.write(path, filter_info.encode())
+        logger.info(f'Filter text file generated for {self.name}.')
 
     def clean_lines(self):
         """Clean, strip and split parsed lines for given QC module.
@@ -120,15 +482,182 @@ class Module(ABC):
                    for colname in lines[1]]
         return lines, columns
 
+    def load_table(self, dtypes, header=1):
+        """Parse the module data rows into a typed table in a single pass.
+
+        Rows are parsed by pandas' C reader from an in-memory buffer instead
+        of casting each field in Python; pandas is imported here so modules
+        without tables don't load it.
+
+        :param dtypes: type of each column (e.g. int, float, str), in order
+        :type dtypes: tuple
+        :param header: index in self.lines of the '#'-prefixed column names
+        :type header: int
+        :return: df: module data with columns named from the header line
+        :rtype: pandas.DataFrame
+        :raises: FormatError: if module data not in FastQC format
+        """
+        import pandas as pd
+
+        lines = self.head(header + 1)
+        if len(lines) <= header:
+            # module without data, e.g. no overrepresented sequences
+            return pd.DataFrame()
+        columns = [colname.strip('#') if colname.startswith('#') else colname
+                   for colname in lines[header].strip('\n').split('\t')]
+        if len(columns) < len(dtypes):
+            raise FormatError('Too few columns in module data.')
+        columns = columns[:len(dtypes)]
+        types = dict(zip(columns, dtypes))
+        # rows are parsed from the raw bytes, copied once
+        rows = bytes(self.section_bytes(header + 1))
+        if not rows:
+            return pd.DataFrame({name: pd.Series(dtype=dtype)
+                                 for name, dtype in types.items()})
+        # short rows would be padded with NaN rather than rejected by the
+        # reader, which cannot be told apart from the NaN FastQC writes
+        lines = rows.split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        if min(line.count(b'\t') for line in lines) < len(columns) - 1:
+            raise FormatError('Missing fields in module data.')
+        try:
+            df = pd.read_csv(io.BytesIO(rows), sep='\t',
+                             header=None, names=columns,
+                             usecols=range(len(columns)), dtype=types,
+                             keep_default_na=False,
+                             na_values={name: ['NaN']
+                                        for name, dtype in types.items()
+                                        if dtype is float},
+                             index_col=False, skip_blank_lines=False,
+                             quoting=csv.QUOTE_NONE)
+        except ValueError as e:
+            # a field that cannot be cast to its column type
+            raise FormatError(str(e)) from e
+        return df
+
+    @profiled('savefig')
+    def save_graph(self, fig):
+        """Save a module graph to the graph file in the module directory.
+
+        The figure is handed to the module's graph consumer instead, if one
+        has been set.
+
+        :param fig: figure to save
+        :type fig: matplotlib.figure.Figure
+        :return: None
+        :rtype: None
+        """
+        if self.graph_consumer is not None:
+            self.graph_consumer(self, fig)
+            return
+        path = os.path.join(self.dir_name, self.graph_file)
+        with self.output.open(path) as f:
+            fig.savefig(f, format=self.graph_format, dpi=self.dpi,
+                        bbox_inches='tight' if self.tight else None)
+
+    def table(self):
+        """Parse the module data rows into a table typed with the module's
+        column types, loading it from the parse cache when the input file has
+        been parsed before.
+
+        :return: df: module data with columns named from the header line
+        :rtype: pandas.DataFrame
+        :raises: FormatError: if module data not in FastQC format
+        """
+        if self.cache is None:
+            return self.load_table(self.dtypes, self.header)
+        df = self.cache.get(self.cache_key, self.name)
+        if df is None:
+            df = self.load_table(self.dtypes, self.header)
+            self.cache.put(self.cache_key, self.name, df)
+        return df
+
+    def set_style(self):
+        """Apply the plotting style used by the module graph. Styles are
+        global matplotlib state, so modules without their own style inherit
+        the one set by the module drawn before them.
+
+        :return: None
+        :rtype: None
+        """
+
+    def template_key(self, data):
+        """Describe the layout of the module graph for the given data;
+        graphs with the same layout only differ in the data of their artists.
+
+        :param data: module data returned by prep_data
+        :return: hashable layout, e.g. the x positions of the graph
+        :rtype: tuple
+        """
+        raise NotImplementedError
+
+    def build_template(self, data):
+        """Build the figure of the module graph with its static parts:
+        axes, spans, ticks, labels and legend.
+
+        :param data: module data returned by prep_data
+        :return: template holding the figure under 'fig' and the artists
+            updated for each graph
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def fill_template(self, template, data):
+        """Update the artists of a template with the data of a graph.
+
+        :param template: template built by build_template
+        :type template: dict
+        :param data: module data returned by prep_data
+        :return: None
+        :rtype: None
+        """
+        raise NotImplementedError
+
+    def template_figure(self, data):
+        """Draw the module graph from its template renderer, reusing the
+        figure built for an earlier graph with the same layout if
+        reuse_figures is set; the module style is only applied when a
+        figure is built.
+
+        :param data: module data returned by prep_data
+        :return: figure holding the module graph
+        :rtype: matplotlib.figure.Figure
+        """
+        key = (type(self).__name__, self.template_key(data))
+        template = TEMPLATES.pop(key, None) if self.reuse_figures else None
+        if template is None:
+            self.set_style()
+            template = self.build_template(data)
+        if self.reuse_figures:
+            TEMPLATES[key] = template
+            while len(TEMPLATES) > MAX_TEMPLATES:
+                TEMPLATES.popitem(last=False)
+        self.fill_template(template, data)
+        return template['fig']
+
+    def render_graph(self):
+        """Draw the module graph, handing it to the render scheduler if one
+        was given so that it is built and saved in a worker process.
+
+        :return: None
+        :rtype: None
+        """
+        if self.scheduler is not None and self.profiler is None:
+            self.scheduler.submit(self)
+        else:
+            with self.stage('create_graph'):
+                self.create_graph()
+
     @abstractmethod
     def module_output(self):
         """Generate all output for a QC module.
 
         Depending on module output may include: report text file, filter text
-        file, graph png file or screen display of module data.
+        file, graph file or screen display of module data.
 
         :return: None
         :rtype: None
         """
         self.parse_text()
-        print(f'Generating output for {self.name}...')
+        logger.info(f'Generating output for {self.name}...')
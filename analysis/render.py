@@ -0,0 +1,119 @@
+"""This module provides a render scheduler which builds and saves QC module
+graphs in worker processes, so that the figures of several modules are
+rendered in parallel while reports are still written in order."""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+from analysis.exceptions import FastQCError
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    """Select the non-interactive Agg backend in each worker process.
+
+    :return: None
+    :rtype: None
+    """
+    matplotlib.use('Agg')
+
+
+def render(module, rc):
+    """Build and save the graph for a QC module in a worker process.
+
+    :param module: parsed QC module with its output directory created
+    :type module: analysis.qc_module.Module
+    :param rc: matplotlib rcParams in effect when the module was submitted
+    :type rc: dict
+    :return: graph files the module's output backend could not write from
+        the worker, to be written by the parent process
+    :rtype: list(tuple(str, bytes))
+    """
+    matplotlib.rcParams.update(rc)
+    module.create_graph()
+    return module.output.collected()
+
+
+def style_params(module):
+    """Apply the style of a QC module and return the resulting rcParams, to
+    be sent to a worker process with the module so that its graph is drawn
+    with the same style as when modules are drawn one after another in a
+    single process.
+
+    :param module: QC module
+    :type module: analysis.qc_module.Module
+    :return: rcParams without the backend, which workers keep as Agg
+    :rtype: dict
+    """
+    module.set_style()
+    return {key: value for key, value in matplotlib.rcParams.items()
+            if not key.startswith('backend')}
+
+
+class RenderScheduler:
+    """Process pool running ``create_graph`` for QC modules.
+
+    Use as a context manager; leaving the context waits for all submitted
+    graphs and raises FastQCError naming any module whose graph could not be
+    rendered.
+    """
+
+    def __init__(self, jobs):
+        """Constructor for RenderScheduler objects.
+
+        :param jobs: number of worker processes
+        :type jobs: int
+        """
+        self.jobs = jobs
+        self.pool = None
+        self.futures = []
+
+    def __enter__(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs,
+                                        initializer=init_worker)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            failed = self.wait()
+        finally:
+            self.pool.shutdown()
+            self.pool = None
+        # report failed graphs unless another error is already propagating
+        if failed and exc_type is None:
+            raise FastQCError(
+                f'Graph rendering failed for {", ".join(failed)}.')
+
+    def submit(self, module):
+        """Queue the graph of a QC module for rendering.
+
+        The module style is applied here and sent with the module, see
+        style_params.
+
+        :param module: parsed QC module with its output directory created
+        :type module: analysis.qc_module.Module
+        :return: None
+        :rtype: None
+        """
+        self.futures.append((module, self.pool.submit(
+            render, module, style_params(module))))
+
+    def wait(self):
+        """Wait for all queued graphs, in submission order.
+
+        :return: names of modules whose graph failed to render
+        :rtype: list
+        """
+        failed = []
+        for module, future in self.futures:
+            try:
+                for path, data in future.result():
+                    module.output.write(path, data)
+            except (Exception, SystemExit) as e:
+                logger.error(f'Graph rendering failed for {module.name}: {e}')
+                failed.append(module.name)
+                module.forget_manifest()
+        self.futures = []
+        return failed
@@ -0,0 +1,136 @@
+"""This module provides a programmatic interface to FastQC files for programs
+that embed the analysis package, e.g. a long-running QC service.
+
+FastQCReport returns module statuses and typed module tables as data. Errors
+are raised as the exceptions in analysis.exceptions rather than ending the
+process, and nothing is written to the output directory or the console.
+"""
+import importlib
+
+from analysis.exceptions import FormatError, ModuleMissingError
+from analysis.fastqc_file import FastQCFile
+
+# the single registry of QC modules, in FastQC order: module name, name of the
+# command-line option selecting the module (None for Basic Statistics, which
+# is always shown) and module class, given as 'submodule.Class' so that each
+# module (and the plotting libraries it needs) is only imported when first used
+MODULES = (
+    ('Basic Statistics', None, 'basic_stats.BasicStatistics'),
+    ('Per base sequence quality', 'per_base_seq_qlty',
+     'base_seq_qlty.PerBaseSeqQlty'),
+    ('Per tile sequence quality', 'per_tile_seq_qlty',
+     'tile_seq_qlty.PerTileSeqQlty'),
+    ('Per sequence quality scores', 'per_seq_qlty_scores',
+     'seq_qlty_scores.PerSeqQltyScores'),
+    ('Per base sequence content', 'per_base_seq_content',
+     'base_seq_content.PerBaseSeqContent'),
+    ('Per sequence GC content', 'per_sequence_gc_content',
+     'seq_gc_content.PerSeqGCContent'),
+    ('Per base N content', 'per_base_n_content',
+     'base_n_content.PerBaseNContent'),
+    ('Sequence Length Distribution', 'seq_len_dist',
+     'seq_len_distribution.SeqLengthDistribution'),
+    ('Sequence Duplication Levels', 'seq_dup_levels',
+     'seq_duplication_levels.SeqDuplicationLevels'),
+    ('Overrepresented sequences', 'overrep_seq',
+     'overrepresented_seqs.OverrepresentedSeqs'),
+    ('Adapter Content', 'adapter_content', 'adapter_content.AdapterContent'),
+    ('Kmer Content', 'kmer_content', 'kmer_content.KmerContent'),
+)
+# QC module classes keyed by module name
+MODULE_CLASSES = {name: path for name, _, path in MODULES}
+# optional QC module classes keyed by command-line option name
+MODULE_OPTIONS = {option: path for _, option, path in MODULES if option}
+
+
+def load_class(path):
+    """Import a QC module class from the analysis package on first use.
+
+    :param path: submodule and class name, e.g. 'kmer_content.KmerContent'
+    :type path: str
+    :return: QC module class
+    :rtype: type
+    """
+    submodule, class_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(f'analysis.{submodule}'),
+                   class_name)
+
+
+class FastQCReport:
+    """Parsed FastQC file giving access to the status and typed table of each
+    QC module.
+    """
+
+    def __init__(self, infile, cache=None):
+        """Constructor for FastQCReport objects.
+
+        :param infile: input FastQC file (.txt, .txt.gz or FastQC .zip)
+        :type infile: str
+        :param cache: on-disk cache of parsed sections and tables
+        :type cache: analysis.cache.ParseCache
+        :raises: FileNotFoundError: if the input file does not exist
+        :raises: FormatError: if a zip archive holds no fastqc_data.txt
+        """
+        self.fastqc = FastQCFile(infile, cache=cache)
+
+    @property
+    def names(self):
+        """Names of the QC modules in the file, in file order."""
+        return list(self.fastqc.sections)
+
+    def section(self, name):
+        """Return the section of a QC module.
+
+        :param name: QC module name
+        :type name: str
+        :return: section of the module
+        :rtype: analysis.fastqc_file.Section
+        :raises: ModuleMissingError: if the module is missing from the file
+        """
+        section = self.fastqc.section(name)
+        if section is None:
+            raise ModuleMissingError(
+                f'Module "{name}" missing from input file.')
+        return section
+
+    def status(self, name):
+        """Return the filter status of a QC module.
+
+        :param name: QC module name
+        :type name: str
+        :return: 'pass', 'warn' or 'fail'
+        :rtype: str
+        :raises: ModuleMissingError: if the module is missing from the file
+        """
+        return self.section(name).status
+
+    def statuses(self):
+        """Return the filter status of every QC module in the file.
+
+        :return: status keyed by module name, in file order
+        :rtype: dict
+        """
+        return {name: section.status
+                for name, section in self.fastqc.sections.items()}
+
+    def module(self, name):
+        """Return the data of a QC module as a typed table.
+
+        :param name: QC module name, e.g. 'Per base sequence quality'
+        :type name: str
+        :return: module data with columns named from the header line
+        :rtype: pandas.DataFrame
+        :raises: ModuleMissingError: if the module is missing from the file
+            or is not a known QC module
+        :raises: FormatError: if the module data is not in FastQC format
+        """
+        self.section(name)
+        if name not in MODULE_CLASSES:
+            raise ModuleMissingError(f'Unknown QC module "{name}".')
+        module = load_class(MODULE_CLASSES[name])(self.fastqc, '')
+        module.parse_text()
+        try:
+            return module.table()
+        except FormatError as e:
+            raise FormatError(
+                f'{name} data is not in FastQC format: {e}') from e
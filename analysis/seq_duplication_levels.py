@@ -1,43 +1,40 @@
 """This module contains functionality for generating reports and visualising
 Sequence Duplication Levels data from FastQC files.
 """
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
 
 
 class SeqDuplicationLevels(Module):
     """Class for Sequence Duplication Levels QC module."""
-    def __init__(self, infile, outdir):
+    # types of the columns in the module table
+    dtypes = (str, float, float)
+    # the column names follow the total percentage line
+    header = 2
+
+    def __init__(self, infile, outdir, **kwargs):
         """Contructor method for Sequence Duplication Levels objects.
 
         :param infile: input FastQC file
         :type infile: str
         :param outdir: output directory
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(infile, outdir)
+        super().__init__(infile, outdir, **kwargs)
         self.name = 'Sequence Duplication Levels'
 
-    def clean_lines(self):
-        """Clean lines for Sequence duplication levels module.
-
-        :return: lines, columns, total_perc
-        :rtype: tuple(list, list, list)
-        """
-        lines = [line.strip('\n').split('\t') for line in self.lines]
-        total_perc = [elem.strip('#') if elem.startswith('#') else float(elem)
-                      for elem in lines[1]]
-        columns = [elem.strip('#') if elem.startswith('#') else elem for elem in
-                   lines[2]]
-        return lines, columns, total_perc
-
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe and
         total percentages list
@@ -46,39 +43,60 @@ class SeqDuplicationLevels(Module):
         :rtype: tuple(pandas.DataFrame, list)
         """
         try:
-            lines, columns, total_perc = self.clean_lines()
-            data = [(line[0], float(line[1]), float(line[2])) for line in lines[3:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            # total percentage line precedes the column names
+            header = self.head(2)[1]
+            total_perc = [elem.strip('#') if elem.startswith('#')
+                          else float(elem)
+                          for elem in header.strip('\n').split('\t')]
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['Duplication Level']
             return df, total_perc
 
-    def create_graph(self):
-        """Plot graph for Sequence duplication and save as PNG file.
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
 
-        :return:
-        :rtype:
+        :return: None
+        :rtype: None
         """
-        df, total_perc = self.prep_data()
-
-        # plot figure
         sns.set_style('darkgrid')
-        fig, ax = plt.subplots(figsize=(10, 8))
-        sns.lineplot(x=df['Duplication Level'],
-                     y=df['Percentage of deduplicated'],
-                     color='red', label='% Deduplicated sequences')
-        sns.lineplot(x=df['Duplication Level'], y=df['Percentage of total'],
-                     color='blue', label='% Total sequences')
-        ax.set_title(
-            f'Percent of seqs remaining if deduplicated {total_perc[1]:.2f}%',
-            fontsize=12)
+
+    def template_key(self, data):
+        """Layout of the graph: the duplication levels.
+
+        :param data: module data and total percentages returned by prep_data
+        :type data: tuple(pandas.DataFrame, list)
+        :return: duplication levels
+        :rtype: tuple
+        """
+        df, _ = data
+        return tuple(df['Duplication Level'])
+
+    def build_template(self, data):
+        """Build the Sequence Duplication Levels figure.
+
+        :param data: module data and total percentages returned by prep_data
+        :type data: tuple(pandas.DataFrame, list)
+        :return: template with the figure, its title and both lines
+        :rtype: dict
+        """
+        df, _ = data
+        fig = Figure(figsize=(10, 8))
+        ax = fig.subplots()
+        lines = plotting.lineplot(ax, x=df['Duplication Level'],
+                                  y=df['Percentage of deduplicated'],
+                                  color='red',
+                                  label='% Deduplicated sequences')
+        lines += plotting.lineplot(ax, x=df['Duplication Level'],
+                                   y=df['Percentage of total'],
+                                   color='blue', label='% Total sequences')
+        title = ax.set_title('', fontsize=12)
         ax.set_xlabel('Sequence Duplication Level', fontsize=10)
         ax.set_ylabel('Total Library (%)')
-        plt.xticks(fontsize=8)
-        plt.yticks(np.arange(0, 101, 10), fontsize=8)
+        ax.tick_params(labelsize=8)
         ax.legend(loc='best', facecolor='white')
         # Show the spine of the axes
         for s in ['left', 'bottom']:
@@ -86,11 +104,38 @@ class SeqDuplicationLevels(Module):
             ax.spines[s].set_color('black')
         # remove top axis
         ax.spines['top'].set_visible(False)
+        return dict(fig=fig, ax=ax, title=title, lines=lines)
+
+    def fill_template(self, template, data):
+        """Update the title and lines with the data of a sample.
+
+        :param template: template built by build_template
+        :type template: dict
+        :param data: module data and total percentages returned by prep_data
+        :type data: tuple(pandas.DataFrame, list)
+        :return: None
+        :rtype: None
+        """
+        df, total_perc = data
+        ax = template['ax']
+        template['title'].set_text(
+            f'Percent of seqs remaining if deduplicated {total_perc[1]:.2f}%')
+        plotting.set_ydata(ax, template['lines'],
+                           [df['Percentage of deduplicated'],
+                            df['Percentage of total']])
+        # the percentage ticks widen the autoscaled limits to 0-100
+        ax.set_yticks(np.arange(0, 101, 10))
+
+    def create_graph(self):
+        """Plot graph for Sequence duplication and save to the graph file.
+
+        :return:
+        :rtype:
+        """
+        data = self.prep_data()
         # save figure
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}')
+        self.save_graph(self.template_figure(data))
+        logger.info(f'Graph file generated for {self.name}')
 
     def module_output(self):
         """Generate output for Sequence Duplication Levels analysis.
@@ -99,8 +144,10 @@ class SeqDuplicationLevels(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -1,44 +1,55 @@
 """This module contains functionality for generating reports and visualising
 Per sequence GC content data from FastQC files.
 """
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
 
 
 class PerSeqGCContent(Module):
     """Class for Per sequence GC content QC module."""
+    # types of the columns in the module table
+    dtypes = (float, float)
 
-    def __init__(self, fastqc, outdir):
-        super().__init__(fastqc, outdir)
+    def __init__(self, fastqc, outdir, **kwargs):
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Per sequence GC content'
 
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df: pandas dataframe containing data for plotting
         :rtype: pandas.DataFrame
-        :raises: ValueError: module data not in FastQC format
+        :raises: FormatError: module data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            data = [(float(line[0]), float(line[1])) for line in lines[2:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['GC Content']
         return df
 
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
+
+        :return: None
+        :rtype: None
+        """
+        sns.set_style('darkgrid')
+
     def create_graph(self):
-        """Plot graph for Per Sequence GC content and save as PNG file.
+        """Plot graph for Per Sequence GC content and save to the graph file.
 
         :return: None
         :rtype: None
@@ -58,20 +69,22 @@ class PerSeqGCContent(Module):
         fit = norm.pdf(x, mean, sd)
 
         # Plot the data
-        sns.set_style('darkgrid')
+        self.set_style()
         # Plot the measured data
-        fig, ax = plt.subplots(1, 1)
-        sns.lineplot(x=x, y=freq, color='red', label='GC count per read')
+        fig = Figure()
+        ax = fig.subplots(1, 1)
+        plotting.lineplot(ax, x=x, y=freq, color='red',
+                          label='GC count per read')
         # Plot modelled normal distribution for GC content
-        sns.lineplot(x=x, y=fit / fit.sum() * freq.sum(), color='blue',
-                     label='Theoretical distribution')
+        plotting.lineplot(ax, x=x, y=fit / fit.sum() * freq.sum(),
+                          color='blue', label='Theoretical distribution')
         # Set legend
         ax.legend(loc='best', facecolor='white')
         # configure axes
         # turn off scientific notation on y-axis
-        plt.gcf().axes[0].yaxis.get_major_formatter().set_scientific(False)
+        ax.yaxis.get_major_formatter().set_scientific(False)
         ax.set_title('GC distribution over all sequences')
-        plt.xlim(x.min(), x.max())
+        ax.set_xlim(x.min(), x.max())
         ax.set_ylim(0)
         ax.set_xticks(np.arange(0, 101, 5))
         ax.set_xlabel('Mean GC content (%)')
@@ -83,10 +96,8 @@ class PerSeqGCContent(Module):
         # remove top axis from display
         ax.spines['top'].set_visible(False)
         # Save figure
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}')
+        self.save_graph(fig)
+        logger.info(f'Graph file generated for {self.name}')
 
     def module_output(self):
         """Generate output for Per sequence GC content analysis.
@@ -95,8 +106,10 @@ class PerSeqGCContent(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -1,58 +1,71 @@
 """This module contains functionality for generating reports and visualising
 Sequence Length Distribution data from FastQC files.
 """
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
 
 
 class SeqLengthDistribution(Module):
     """Class for Sequence Length Distribution QC module."""
-    def __init__(self, infile, outdir):
-        super().__init__(infile, outdir)
+    # types of the columns in the module table
+    dtypes = (str, float)
+
+    def __init__(self, infile, outdir, **kwargs):
+        super().__init__(infile, outdir, **kwargs)
         self.name = 'Sequence Length Distribution'
 
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df:
         :rtype: pandas.DataFrame
-        :raises: ValueError: module data not in FastQC format
+        :raises: FormatError: module data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            data = [(line[0], float(line[1])) for line in lines[2:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['Length']
             return df
 
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
+
+        :return: None
+        :rtype: None
+        """
+        sns.set_style('darkgrid')
+
     def create_graph(self):
-        """Plot graph for Sequence Length Distribution and save as PNG file.
+        """Plot graph for Sequence Length Distribution and save to the graph file.
 
         :return: None
         :rtype: None
         """
         df = self.prep_data()
         # plot graph
-        sns.set_style('darkgrid')
-        fig, ax = plt.subplots(1, 1)
+        self.set_style()
+        fig = Figure()
+        ax = fig.subplots(1, 1)
         # if number of lengths is 1 or less plot a bar plot
         if df.index.size <= 1:
-            sns.barplot(x=df.index, y=df['Count'])
-        sns.lineplot(x=df['Length'], y=df['Count'], color='red')
+            sns.barplot(x=df.index, y=df['Count'], ax=ax)
+        plotting.lineplot(ax, x=df['Length'], y=df['Count'], color='red')
         ax.set_title('Distribution of sequence lengths over all sequences')
         ax.set_xlabel('Sequence Length (bp)')
         # turn off scientific notation on y axis
-        plt.gcf().axes[0].yaxis.get_major_formatter().set_scientific(False)
+        ax.yaxis.get_major_formatter().set_scientific(False)
         # show spines of axes
         for s in ['left', 'bottom']:
             ax.spines[s].set_linewidth(1)
@@ -60,10 +73,8 @@ class SeqLengthDistribution(Module):
         # hide top axis
         ax.spines['top'].set_visible(False)
         # save fig
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+        self.save_graph(fig)
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for Sequence length distribution analysis.
@@ -72,8 +83,10 @@ class SeqLengthDistribution(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -1,68 +1,83 @@
 """This module contains functionality for generating reports and visualising
 Per sequence quality scores data from FastQC files."""
-import os
-import sys
+import logging
 
-import matplotlib.pyplot as plt
-import pandas as pd
 import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis import plotting
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
 
 
 class PerSeqQltyScores(Module):
     """Class for Per sequence quality scores QC module."""
+    # types of the columns in the module table
+    dtypes = (int, float)
 
-    def __init__(self, fastqc, outdir):
+    def __init__(self, fastqc, outdir, **kwargs):
         """Constructor for Per sequence quality objects
 
         :param fastqc: input FastQC file
         :type fastqc: str
         :param outdir: output directory
         :type outdir: str
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
          """
-        super().__init__(fastqc, outdir)
+        super().__init__(fastqc, outdir, **kwargs)
         self.name = 'Per sequence quality scores'
 
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df: pandas dataframe containing data for plotting
         :rtype: pandas.DataFrame
-        :raises: ValueError: module data not in FastQC format
+        :raises: FormatError: module data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            data = [(int(line[0]), float(line[1])) for line in lines[2:]]
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            df = pd.DataFrame(data=data, columns=columns)
             df.index = df['Quality']
             return df
 
+    def set_style(self):
+        """Apply the plotting style used by the module graph.
+
+        :return: None
+        :rtype: None
+        """
+        sns.set_style('darkgrid')
+
     def create_graph(self):
-        """Plot graph for Per sequence quality scores and save it as a PNG file.
+        """Plot graph for Per sequence quality scores and save it to the graph file.
 
         :return: None
         :rtype: None
         """
         df = self.prep_data()
         # plot graph
-        sns.set_style('darkgrid')
-        fig, ax = plt.subplots(1, 1)
-        sns.lineplot(x=df['Quality'], y=df['Count'], color='red')
+        self.set_style()
+        fig = Figure()
+        ax = fig.subplots(1, 1)
+        plotting.lineplot(ax, x=df['Quality'], y=df['Count'], color='red')
 
         ax.set_title('Quality score distribution over all sequences')
 
         ax.set_xlabel('Quality Score')
         ax.set_ylabel('Count')
         ax.axes.set_ylim(0)
-        plt.xticks(df.index, fontsize=8)
+        ax.set_xticks(df.index)
         # turn off scientific notation on y-axis
-        plt.gcf().axes[0].yaxis.get_major_formatter().set_scientific(False)
-        plt.yticks(ax.get_yticks(), fontsize=8)
+        ax.yaxis.get_major_formatter().set_scientific(False)
+        ax.set_yticks(ax.get_yticks())
+        ax.tick_params(labelsize=8)
         # get coordinates for most frequent quality
         max_x, max_y = df.loc[df['Count'] == df['Count'].max()].iloc[0, :]
         # annotate maximum point to indicated average quality per read
@@ -77,11 +92,9 @@ class PerSeqQltyScores(Module):
         # Don't show top axis to prevent overlap
         ax.spines['top'].set_visible(False)
 
-        # save plot as PNG file
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, bbox_inches='tight', dpi=300)
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+        # save plot to graph file
+        self.save_graph(fig)
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for Per sequence quality scores analysis.
@@ -90,8 +103,10 @@ class PerSeqQltyScores(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
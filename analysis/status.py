@@ -0,0 +1,168 @@
+"""This module provides a matrix of the pass/warn/fail status of every QC
+module over many FastQC files, for triaging large runs.
+
+Statuses are read from the ``>>Module\\tstatus`` header lines alone: module
+tables are not parsed and neither pandas nor the plotting libraries are
+imported, so thousands of files are scanned in seconds.
+"""
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis.exceptions import FastQCError, FormatError
+from analysis.fastqc_file import GZIP_MAGIC, STDIN, find_data_member
+from analysis.report import MODULE_CLASSES
+
+logger = logging.getLogger(__name__)
+
+# module header line, e.g. '>>Per base sequence quality\tpass'
+HEADER = re.compile(rb'^>>(?!END_MODULE)([^\t\r\n]+)\t([^\t\r\n]*)', re.M)
+# status matrix file formats
+STATUS_FORMATS = ('tsv', 'json')
+
+
+def read_data(infile):
+    """Read the FastQC data of a file, decompressed.
+
+    :param infile: FastQC file (.txt, .txt.gz or FastQC .zip), or '-' for
+        standard input
+    :type infile: str
+    :return: fastqc_data.txt content
+    :rtype: bytes
+    :raises: FormatError: if a zip archive holds no fastqc_data.txt
+    """
+    if infile == STDIN:
+        data = sys.stdin.buffer.read()
+        if data[:2] == GZIP_MAGIC:
+            return gzip.decompress(data)
+        if data[:4] == b'PK\x03\x04':
+            return read_data(io.BytesIO(data))
+        return data
+    if zipfile.is_zipfile(infile):
+        with zipfile.ZipFile(infile) as zf:
+            member = find_data_member(zf)
+            data = zf.read(member)
+        return gzip.decompress(data) if member.endswith('.gz') else data
+    with open(infile, 'rb') as f:
+        data = f.read()
+    return gzip.decompress(data) if data[:2] == GZIP_MAGIC else data
+
+
+def scan_statuses(infile):
+    """Read the status of each QC module in a FastQC file.
+
+    :param infile: FastQC file (.txt, .txt.gz or FastQC .zip), or '-' for
+        standard input
+    :type infile: str
+    :return: status keyed by module name, in file order
+    :rtype: dict
+    :raises: FormatError: if a zip archive holds no fastqc_data.txt, or
+        the data holds no module header lines
+    :raises: UnicodeDecodeError: if a module header is not UTF-8
+    """
+    statuses = {name.decode(): status.decode()
+                for name, status in HEADER.findall(read_data(infile))}
+    if not statuses:
+        raise FormatError('No QC modules found in FastQC file.')
+    return statuses
+
+
+def scan_sample(sample, infile):
+    """Read the module statuses of one sample, reporting errors as a message
+    so that one bad file does not stop a pool of workers.
+
+    :param sample: sample name
+    :type sample: str
+    :param infile: FastQC file
+    :type infile: str
+    :return: sample, statuses and error message (None on success)
+    :rtype: tuple(str, dict, str)
+    """
+    try:
+        return sample, scan_statuses(infile), None
+    except (OSError, EOFError, ValueError, zlib.error, zipfile.BadZipFile,
+            FastQCError) as e:
+        # ValueError covers headers that are not UTF-8
+        return sample, {}, str(e)
+
+
+def status_matrix(samples, jobs=None):
+    """Read the module statuses of many FastQC files.
+
+    :param samples: FastQC file for each sample name
+    :type samples: dict
+    :param jobs: number of worker processes reading files, files are read
+        in-process if 1
+    :type jobs: int
+    :return: module names (known modules first, in FastQC order), statuses
+        keyed by sample and module name, and error messages keyed by sample
+    :rtype: tuple(list, dict, dict)
+    """
+    args = (list(samples), list(samples.values()))
+    if jobs == 1 or len(samples) < 2:
+        results = list(map(scan_sample, *args))
+    else:
+        workers = jobs or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # hand each worker a few large chunks rather than one file at a
+            # time
+            results = list(pool.map(
+                scan_sample, *args,
+                chunksize=max(1, len(samples) // (workers * 4))))
+    matrix, errors = {}, {}
+    modules = dict.fromkeys(MODULE_CLASSES)
+    for sample, statuses, error in results:
+        if error is not None:
+            logger.warning(f'{sample}: {error}')
+            errors[sample] = error
+            continue
+        matrix[sample] = statuses
+        modules.update(dict.fromkeys(statuses))
+    # drop known modules absent from every file
+    present = set().union(*matrix.values())
+    return [name for name in modules if name in present], matrix, errors
+
+
+def write_matrix(path, modules, matrix, errors=None, fmt='tsv'):
+    """Write a status matrix with one row per sample and one column per
+    module; modules missing from a sample are left empty (null in JSON).
+
+    :param path: output file
+    :type path: str
+    :param modules: module names, in column order
+    :type modules: list
+    :param matrix: statuses keyed by sample and module name
+    :type matrix: dict
+    :param errors: error messages of samples that could not be read,
+        recorded as 'error' in every column of a TSV matrix
+    :type errors: dict
+    :param fmt: 'tsv' or 'json'
+    :type fmt: str
+    :return: None
+    :rtype: None
+    """
+    errors = errors or {}
+    if fmt == 'json':
+        report = dict(
+            modules=modules,
+            samples={sample: {name: statuses.get(name) for name in modules}
+                     for sample, statuses in matrix.items()},
+            errors=errors)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1)
+        return
+    lines = ['\t'.join(['sample'] + modules)]
+    for sample, statuses in matrix.items():
+        lines.append('\t'.join([sample] + [statuses.get(name, '')
+                                           for name in modules]))
+    for sample in errors:
+        lines.append('\t'.join([sample] + ['error'] * len(modules)))
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
@@ -1,21 +1,37 @@
 """This module contains functionality for generating reports and visualising
 Per tile sequence quality data from FastQC files.
 """
+import logging
 import os
-import sys
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
+from matplotlib.figure import Figure
 
-from analysis.qc_module import Module
+from analysis.exceptions import FormatError
+from analysis.qc_module import Module, profiled
+
+logger = logging.getLogger(__name__)
+
+# most tick labels drawn on each axis of the heatmap
+MAX_BASE_LABELS = 100
+MAX_TILE_LABELS = 64
+# deviations from the mean quality of a base at which FastQC warns and fails
+WARN_DEVIATION = 2
+FAIL_DEVIATION = 5
+# robust z-score below which a tile is an outlier at a base, on the scale of
+# a standard normal z-score (Iglewicz and Hoaglin's modified z-score)
+OUTLIER_ZSCORE = 3.5
+# file listing the outlier tiles in the module directory
+OUTLIER_FILE = 'bad_tiles.tsv'
 
 
 class PerTileSeqQlty(Module):
     """Class for per tile sequence quality QC module."""
+    # types of the columns in the module table
+    dtypes = (int, int, float)
 
-    def __init__(self, infile, outdir):
+    def __init__(self, infile, outdir, fast=True, max_tiles=None, **kwargs):
         """Constructor for Per tile sequence quality objects.
 
         Objects from this class inherit fastqc input file and output directory
@@ -25,57 +41,260 @@ class PerTileSeqQlty(Module):
         :type infile: str
         :param outdir: output directory
         :type outdir: str
+        :param fast: draw the heatmap as a single image with imshow rather
+            than with seaborn's per-cell heatmap
+        :type fast: bool
+        :param max_tiles: if there are more tiles than this, average
+            neighbouring tiles so at most max_tiles rows are drawn
+        :type max_tiles: int
+        :param kwargs: options passed on to Module, e.g. scheduler and
+            on_exists
         """
-        super().__init__(infile, outdir)
+        super().__init__(infile, outdir, **kwargs)
         self.name = 'Per tile sequence quality'
+        self.fast = fast
+        self.max_tiles = max_tiles
+        # pivot table shared by the heatmap and the outlier report
+        self.pivot = None
+
+    def render_options(self):
+        """Options the module outputs depend on, including the drawing method
+        and tile downsampling of the heatmap.
+
+        :return: graph format, resolution, cropping, fast and max_tiles
+        :rtype: tuple
+        """
+        return super().render_options() + (self.fast, self.max_tiles)
+
+    def parse_text(self):
+        """Parse the module from the input file, dropping the pivot table of
+        any section parsed before.
 
+        :return: None
+        :rtype: None
+        """
+        super().parse_text()
+        self.pivot = None
+
+    @profiled('prep_data')
     def prep_data(self):
         """Process data into appropriate types and create dataframe.
 
         :return: df: pandas dataframe containing data for plotting
         :rtype: pandas.DataFrame
-        :raises: ValueError: module data not in FastQC format
+        :raises: FormatError: module data not in FastQC format
         """
         try:
-            lines, columns = self.clean_lines()
-            # cast data in each line to appropriate type
-            data = ((int(line[0]), int(line[1]), float(line[2])) for line in lines[2:])
-        except ValueError:
-            print('Module data is not in FastQC format.')
-            sys.exit(1)
+            # parse data lines into appropriately typed columns
+            df = self.table()
+        except ValueError as e:
+            raise FormatError(
+                f'{self.name} data is not in FastQC format.') from e
         else:
-            # exclude module header and column lines
-            df = pd.DataFrame(data, columns=columns)
             # create pivot table
-            df = df.pivot('Tile', 'Base', 'Mean')
+            df = df.pivot(index='Tile', columns='Base', values='Mean')
             df = df.sort_values(by='Tile', ascending=False)
             return df
 
-    def create_graph(self):
-        """Plot graph for Per tile sequence quality and save as PNG file.
+    def pivot_table(self):
+        """Return the pivot table of the module, prepared on first use so
+        that the heatmap and the outlier report parse the table only once.
+
+        :return: pivot table of mean quality deviation per tile and base
+        :rtype: pandas.DataFrame
+        :raises: FormatError: module data not in FastQC format
+        """
+        if self.pivot is None:
+            self.pivot = self.prep_data()
+        return self.pivot
+
+    def downsample(self, df):
+        """Average groups of neighbouring tiles so that no more than max_tiles
+        rows remain; each group is labelled with its first tile.
+
+        :param df: pivot table of mean quality deviation per tile and base
+        :type df: pandas.DataFrame
+        :return: values, tiles: matrix to plot and its row labels
+        :rtype: tuple(numpy.ndarray, numpy.ndarray)
+        """
+        values = df.to_numpy()
+        tiles = df.index.to_numpy()
+        if not self.max_tiles or len(tiles) <= self.max_tiles:
+            return values, tiles
+        group = -(-len(tiles) // self.max_tiles)  # ceiling division
+        # pad with NaN rows so the tiles split into equal groups
+        pad = -len(tiles) % group
+        padded = np.vstack([values,
+                            np.full((pad, values.shape[1]), np.nan)])
+        grouped = padded.reshape(-1, group, values.shape[1])
+        with np.errstate(invalid='ignore'):
+            values = np.nanmean(grouped, axis=1)
+        return values, tiles[::group]
+
+    def find_outliers(self, df):
+        """Find the tiles whose quality drops below the other tiles of the
+        flowcell, and over which bases.
+
+        A tile is flagged at a base if its deviation from the mean quality is
+        at least FAIL_DEVIATION, or at least WARN_DEVIATION with a robust
+        z-score beyond OUTLIER_ZSCORE. The z-score is taken against the median
+        and median absolute deviation of all tiles at the base, so a few bad
+        tiles do not hide each other. The flags are computed on the whole
+        tile by base matrix at once and consecutive flagged bases of a tile
+        are merged into one range.
+
+        :param df: pivot table of mean quality deviation per tile and base
+        :type df: pandas.DataFrame
+        :return: one row per tile and range of flagged bases, with the lowest
+            deviation and z-score in the range and the rule which flagged it
+            ('threshold' if any base is beyond FAIL_DEVIATION, else 'zscore')
+        :rtype: pandas.DataFrame
+        """
+        df = df.sort_index()
+        values = df.to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            median = np.nanmedian(values, axis=0)
+            mad = np.nanmedian(np.abs(values - median), axis=0)
+            # bases where most tiles agree exactly have no spread to scale by
+            zscores = np.where(mad > 0, 0.6745 * (values - median) / mad, 0)
+        failed = values <= -FAIL_DEVIATION
+        flagged = failed | ((values <= -WARN_DEVIATION)
+                            & (zscores <= -OUTLIER_ZSCORE))
+        # runs of flagged bases start where a row steps up from False and end
+        # where it steps down; both come out of nonzero in row-major order
+        edges = np.diff(np.pad(flagged, ((0, 0), (1, 1))).astype(np.int8),
+                        axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        bases = df.columns.to_numpy()
+        runs = list(zip(rows, starts, ends))
+        return pd.DataFrame({
+            'tile': df.index.to_numpy()[rows],
+            'start': bases[starts],
+            'end': bases[ends - 1],
+            'bases': ends - starts,
+            'min_deviation': [values[row, start:end].min()
+                              for row, start, end in runs],
+            'min_zscore': [zscores[row, start:end].min()
+                           for row, start, end in runs],
+            'rule': ['threshold' if failed[row, start:end].any()
+                     else 'zscore' for row, start, end in runs]})
+
+    @profiled('outliers')
+    def create_outlier_report(self):
+        """Write the outlier tiles and base ranges to a tab-separated file in
+        the module directory, with a header line only if there are none.
 
         :return: None
         :rtype: None
         """
-        df = self.prep_data()
+        outliers = self.find_outliers(self.pivot_table())
+        path = os.path.join(self.dir_name, OUTLIER_FILE)
+        self.output.write(path, outliers.to_csv(
+            sep='\t', index=False, float_format='%.2f').encode())
+        logger.info(f'{len(outliers.tile.unique())} outlier tiles written '
+                    f'to {OUTLIER_FILE} for {self.name}.')
+
+    @property
+    def outputs(self):
+        """Names of the files written to the module directory."""
+        return super().outputs + (OUTLIER_FILE,)
+
+    def create_report(self):
+        """Generate the report text file and the outlier tile file.
+
+        :return: None
+        :rtype: None
+        """
+        super().create_report()
+        self.create_outlier_report()
+
+    def template_key(self, data):
+        """Layout of the graph: the tiles and bases of the heatmap.
+
+        :param data: pivot table and the matrix and row labels to plot
+        :type data: tuple(pandas.DataFrame, numpy.ndarray, numpy.ndarray)
+        :return: drawing method, tiles and bases
+        :rtype: tuple
+        """
+        df, _, tiles = data
+        return self.fast, tuple(tiles), tuple(df.columns)
+
+    def build_template(self, data):
+        """Build the Per tile sequence quality heatmap figure.
+
+        :param data: pivot table and the matrix and row labels to plot
+        :type data: tuple(pandas.DataFrame, numpy.ndarray, numpy.ndarray)
+        :return: template with the figure and the heatmap
+        :rtype: dict
+        """
+        df, values, tiles = data
         # set up figure
-        fig, ax = plt.subplots(figsize=(12, 6))
-        # generate custom diverging palette
-        sns.heatmap(df, cmap='RdBu', cbar=False)
-        plt.title('Quality per tile', fontsize=10)
+        fig = Figure(figsize=(12, 6))
+        ax = fig.subplots()
+        if self.fast:
+            # draw the whole matrix as one image, cells centred on integers
+            image = ax.imshow(values, cmap='RdBu', aspect='auto',
+                              interpolation='nearest')
+            # like sns.heatmap, hide the grid a leaked seaborn style draws
+            # over the cells
+            ax.grid(False)
+            offset = -0.5
+        else:
+            import seaborn as sns
+            # generate custom diverging palette
+            sns.heatmap(values, cmap='RdBu', cbar=False, ax=ax)
+            image = ax.collections[0]
+            offset = 0
+        ax.set_title('Quality per tile', fontsize=10)
         ax.set_xlabel('Position in read (bp)', fontsize=8)
         ax.set_ylabel('Tile', fontsize=8)
-        plt.xticks(np.arange(df.columns.size), df.columns, rotation=0,
-                   fontsize=6, ha='left')
-        ax.set_yticklabels(df.index[::4], fontsize=6)
+        # label every base and every fourth row, thinning the labels on large
+        # flowcells where laying out thousands of labels dominates run time
+        xstep = max(1, -(-df.columns.size // MAX_BASE_LABELS))
+        ystep = max(4, -(-len(tiles) // MAX_TILE_LABELS))
+        ax.set_xticks(np.arange(0, df.columns.size, xstep) + offset)
+        ax.set_xticklabels(df.columns[::xstep], rotation=0, fontsize=6,
+                           ha='left')
+        ax.set_yticks(np.arange(0, len(tiles), ystep) + 0.5 + offset)
+        ax.set_yticklabels(tiles[::ystep], rotation=0, fontsize=6)
         ax.yaxis.set_ticks_position('none')
         ax.xaxis.set_ticks_position('none')
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        return dict(fig=fig, ax=ax, image=image)
 
-        # save figure as png
-        path = os.path.join(self.dir_name, 'graph.png')
-        plt.savefig(path, dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f'Graph file generated for {self.name}.')
+    def fill_template(self, template, data):
+        """Update the heatmap with the data of a sample, scaling its colours
+        to the data range.
+
+        :param template: template built by build_template
+        :type template: dict
+        :param data: pivot table and the matrix and row labels to plot
+        :type data: tuple(pandas.DataFrame, numpy.ndarray, numpy.ndarray)
+        :return: None
+        :rtype: None
+        """
+        _, values, _ = data
+        values = np.ma.masked_invalid(values)
+        image = template['image']
+        if self.fast:
+            image.set_data(values)
+        else:
+            image.set_array(values)
+        image.set_clim(values.min(), values.max())
+
+    def create_graph(self):
+        """Plot graph for Per tile sequence quality and save to the graph file.
+
+        :return: None
+        :rtype: None
+        """
+        df = self.pivot_table()
+        values, tiles = self.downsample(df)
+        # save figure to graph file
+        self.save_graph(self.template_figure((df, values, tiles)))
+        logger.info(f'Graph file generated for {self.name}.')
 
     def module_output(self):
         """Generate output for Per tile sequence quality analysis.
@@ -84,8 +303,10 @@ class PerTileSeqQlty(Module):
         :rtype: None
         """
         super().module_output()
-        self.make_dir()
+        if not self.make_dir():
+            return
         self.create_report()
         self.create_filter_text()
-        self.create_graph()
-        print('Completed.\n' + '-' * 80)
+        self.render_graph()
+        self.update_manifest()
+        logger.info('Completed.\n' + '-' * 80)
@@ -0,0 +1,119 @@
+"""Graph rendering benchmark for FastQC Report Generator
+
+Times ``create_graph`` for each plotting QC module with the lightweight
+``analysis.plotting.lineplot`` and again with seaborn's ``lineplot`` swapped
+in, as the modules used before, and prints the best time of several runs.
+
+Usage::
+
+    python benchmarks/render.py fastqc_data.txt [-n RUNS]
+
+.. py:function: seaborn_lineplot: draw a line with seaborn's lineplot.
+.. py:function: time_graph: time the best of several create_graph calls.
+.. py:function: main: entry point to program.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import plotting  # noqa: E402
+from analysis.adapter_content import AdapterContent  # noqa: E402
+from analysis.base_n_content import PerBaseNContent  # noqa: E402
+from analysis.base_seq_content import PerBaseSeqContent  # noqa: E402
+from analysis.fastqc_file import FastQCFile  # noqa: E402
+from analysis.kmer_content import KmerContent  # noqa: E402
+from analysis.seq_duplication_levels import SeqDuplicationLevels  # noqa: E402
+from analysis.seq_gc_content import PerSeqGCContent  # noqa: E402
+from analysis.seq_len_distribution import SeqLengthDistribution  # noqa: E402
+from analysis.seq_qlty_scores import PerSeqQltyScores  # noqa: E402
+
+# modules whose graphs are drawn with plotting.lineplot
+MODULES = (PerSeqQltyScores, PerBaseSeqContent, PerSeqGCContent,
+           PerBaseNContent, SeqLengthDistribution, SeqDuplicationLevels,
+           AdapterContent, KmerContent)
+
+
+def seaborn_lineplot(ax, x, y, hue=None, **kwargs):
+    """
+    .. py:function:: seaborn_lineplot(ax, x, y, hue=None, **kwargs)
+
+    Draws a line with seaborn's lineplot and its default estimator and
+    confidence interval, for comparison with plotting.lineplot.
+
+    :param ax: axes to draw on
+    :type ax: matplotlib.axes.Axes
+    :return: lines added to the axes, as returned by plotting.lineplot
+    :rtype: list
+    """
+    import seaborn as sns
+    count = len(ax.lines)
+    sns.lineplot(x=x, y=y, hue=hue, ax=ax, **kwargs)
+    return ax.lines[count:]
+
+
+def time_graph(module, runs):
+    """
+    .. py:function:: time_graph(module, runs)
+
+    Times create_graph for a parsed module, keeping the best of several runs.
+
+    :param module: parsed QC module with an output directory
+    :type module: analysis.qc_module.Module
+    :param runs: number of runs
+    :type runs: int
+    :return: best wall time in seconds
+    :rtype: float
+    """
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            module.create_graph()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """The entry point for the program."""
+    parser = argparse.ArgumentParser(description='''Benchmark graph rendering
+        with plotting.lineplot against seaborn's lineplot.''')
+    parser.add_argument('file', metavar='fastqc_file',
+                        help='FastQC file to render graphs for')
+    parser.add_argument('-n', '--runs', type=int, default=3,
+                        help='Number of timed runs (best is reported)')
+    args = parser.parse_args()
+
+    fastqc = FastQCFile(args.file)
+    lineplot = plotting.lineplot
+    totals = [0, 0]
+    print(f'{"module":<32}{"seaborn (s)":>12}{"plotting (s)":>14}'
+          f'{"speed-up":>10}')
+    with tempfile.TemporaryDirectory() as outdir:
+        for module_class in MODULES:
+            module = module_class(fastqc, outdir)
+            module.parse_text()
+            module.dir_name = outdir
+            times = []
+            for implementation in (seaborn_lineplot, lineplot):
+                plotting.lineplot = implementation
+                times.append(time_graph(module, args.runs))
+            plotting.lineplot = lineplot
+            totals = [total + t for total, t in zip(totals, times)]
+            print(f'{module.name:<32}{times[0]:>12.3f}{times[1]:>14.3f}'
+                  f'{times[0] / times[1]:>9.2f}x')
+    print(f'{"total":<32}{totals[0]:>12.3f}{totals[1]:>14.3f}'
+          f'{totals[0] / totals[1]:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
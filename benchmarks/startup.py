@@ -0,0 +1,116 @@
+"""Startup-time benchmark for FastQC Report Generator
+
+Compares the start-up cost of a basic-statistics-only run (m1), which imports
+only the modules it needs, against importing every analysis module up front
+as the script used to do. Import times are read from ``python -X importtime``
+and wall times are the best of several runs.
+
+Usage::
+
+    python benchmarks/startup.py fastqc_data.txt [-n RUNS]
+
+.. py:function: import_times: run a command under -X importtime.
+.. py:function: best_wall_time: time the best of several runs of a command.
+.. py:function: main: entry point to program.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'fastqc_report.py')
+HEAVY = ('matplotlib', 'seaborn', 'pandas', 'numpy', 'scipy')
+# importing every analysis module, as fastqc_report.py did at top level
+EAGER = ('import analysis.basic_stats, analysis.base_seq_qlty, '
+         'analysis.tile_seq_qlty, analysis.seq_qlty_scores, '
+         'analysis.base_seq_content, analysis.seq_gc_content, '
+         'analysis.base_n_content, analysis.seq_len_distribution, '
+         'analysis.seq_duplication_levels, analysis.overrepresented_seqs, '
+         'analysis.adapter_content, analysis.kmer_content')
+
+
+def import_times(cmd):
+    """
+    .. py:function:: import_times(cmd)
+
+    Runs a command under ``-X importtime`` and collects cumulative import
+    times of top-level packages.
+
+    :param cmd: arguments to pass to the Python interpreter
+    :type cmd: list
+    :return: total import time (us) and cumulative time per top-level package
+    :rtype: tuple(int, dict)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + cmd,
+                            cwd=ROOT, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    total = 0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative, name = line.split(':', 1)[1].split('|')
+        total += int(self_us)
+        # nested imports are indented after the leading space
+        name = name[1:]
+        if not name.startswith(' ') or name.strip() in HEAVY:
+            name = name.strip()
+            packages[name] = max(packages.get(name, 0), int(cumulative))
+    return total, packages
+
+
+def best_wall_time(cmd, runs):
+    """
+    .. py:function:: best_wall_time(cmd, runs)
+
+    Times a Python command, keeping the best of several runs.
+
+    :param cmd: arguments to pass to the Python interpreter
+    :type cmd: list
+    :param runs: number of runs
+    :type runs: int
+    :return: best wall time in seconds
+    :rtype: float
+    """
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + cmd, cwd=ROOT,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """The entry point for the program."""
+    parser = argparse.ArgumentParser(description='''Benchmark start-up time of
+        a basic statistics run against importing all analysis modules.''')
+    parser.add_argument('file', metavar='fastqc_file',
+                        help='FastQC file for the basic statistics run')
+    parser.add_argument('-n', '--runs', type=int, default=5,
+                        help='Number of timed runs (best is reported)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as outdir:
+        cases = [
+            ('m1 only (lazy imports)',
+             [SCRIPT, os.path.abspath(args.file), outdir, 'm1']),
+            ('all analysis modules imported', ['-c', EAGER]),
+        ]
+        print(f'{"case":<32}{"wall (s)":>10}{"imports (ms)":>14}  '
+              f'heavy packages loaded')
+        for label, cmd in cases:
+            wall = best_wall_time(cmd, args.runs)
+            total, packages = import_times(cmd)
+            heavy = ', '.join(f'{name} {packages[name] / 1000:.0f}ms'
+                              for name in HEAVY if name in packages)
+            print(f'{label:<32}{wall:>10.3f}{total / 1000:>14.1f}  '
+                  f'{heavy or "none"}')
+
+
+if __name__ == '__main__':
+    main()
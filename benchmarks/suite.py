@@ -0,0 +1,224 @@
+"""Benchmark suite for FastQC Report Generator
+
+Times reading the FastQC file, the full output of each QC module and the
+end-to-end command line run (``m1 -all``) on the synthetic profiles of
+``benchmarks/synthetic.py``: a small MiSeq run, variable-length long reads and
+a NovaSeq S4 flowcell with thousands of tiles and large Kmer Content and
+Overrepresented sequences tables.
+
+Results are written as JSON with one entry per benchmark, keyed
+``<profile>/<benchmark>``, holding the best and median of several runs.
+Given a baseline written by an earlier run, each benchmark's best time is
+compared against it and the suite exits with status 1 when any is slower by
+more than the tolerance.
+
+Usage::
+
+    python benchmarks/suite.py [-o results.json] [--baseline baseline.json]
+                               [--save-baseline] [-n RUNS]
+
+.. py:function: time_best: time several runs of a callable.
+.. py:function: run_profile: run the benchmarks of a synthetic profile.
+.. py:function: compare: compare results against a baseline.
+.. py:function: main: entry point to program.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic  # noqa: E402
+from analysis.fastqc_file import FastQCFile  # noqa: E402
+from analysis.report import MODULE_CLASSES, load_class  # noqa: E402
+
+# version of the results format
+RESULTS_VERSION = 1
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+
+
+def time_best(func, runs):
+    """
+    .. py:function:: time_best(func, runs)
+
+    Times several runs of a callable, with its console output discarded.
+
+    :param func: callable to time
+    :type func: callable
+    :param runs: number of runs
+    :type runs: int
+    :return: best and median wall time in seconds
+    :rtype: dict
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            func()
+        times.append(time.perf_counter() - start)
+    return dict(best_s=round(min(times), 6),
+                median_s=round(statistics.median(times), 6))
+
+
+def run_profile(name, datadir, runs, cli=True):
+    """
+    .. py:function:: run_profile(name, datadir, runs, cli=True)
+
+    Runs the benchmarks of a synthetic profile: reading the file, the output
+    of each QC module and, optionally, the command line run of all modules.
+
+    :param name: profile name, a key of synthetic.PROFILES
+    :type name: str
+    :param datadir: directory the synthetic files are kept in
+    :type datadir: str
+    :param runs: number of timed runs of each benchmark
+    :type runs: int
+    :param cli: also time the end-to-end command line run
+    :type cli: bool
+    :return: timings keyed by benchmark name
+    :rtype: dict
+    """
+    path = synthetic.write_profile(name, datadir)
+    results = {'read': time_best(lambda: FastQCFile(path), runs)}
+    fastqc = FastQCFile(path)
+    with tempfile.TemporaryDirectory() as outdir:
+        for module_name, class_path in MODULE_CLASSES.items():
+            module_class = load_class(class_path)
+            # a new module for each run, so no run reuses the table or pivot
+            # table parsed by the one before; template figures are not kept
+            # either, as reuse_figures is off
+            results[f'module/{module_name}'] = time_best(
+                lambda: module_class(fastqc, outdir,
+                                     on_exists='overwrite').module_output(),
+                runs)
+        if cli:
+            command = [sys.executable, os.path.join(ROOT, 'fastqc_report.py'),
+                       path, outdir, 'm1', '-all', '--overwrite']
+            results['cli'] = time_best(
+                lambda: subprocess.run(command, check=True,
+                                       stdout=subprocess.DEVNULL), runs)
+    return {f'{name}/{benchmark}': timing
+            for benchmark, timing in results.items()}
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """
+    .. py:function:: compare(results, baseline, tolerance, min_delta)
+
+    Compares the best time of each benchmark against a baseline and prints
+    the ratio of each.
+
+    :param results: benchmark timings of this run
+    :type results: dict
+    :param baseline: benchmark timings of the baseline run
+    :type baseline: dict
+    :param tolerance: allowed slow-down as a fraction of the baseline time
+    :type tolerance: float
+    :param min_delta: slow-downs below this many seconds are ignored as noise
+    :type min_delta: float
+    :return: names of the benchmarks that regressed
+    :rtype: list
+    """
+    regressions = []
+    print(f'{"benchmark":<52}{"baseline (s)":>13}{"now (s)":>10}'
+          f'{"ratio":>8}')
+    for name, timing in results.items():
+        if name not in baseline:
+            print(f'{name:<52}{"-":>13}{timing["best_s"]:>10.3f}')
+            continue
+        before, now = baseline[name]['best_s'], timing['best_s']
+        ratio = now / before if before else float('inf')
+        regressed = (now > before * (1 + tolerance)
+                     and now - before > min_delta)
+        if regressed:
+            regressions.append(name)
+        print(f'{name:<52}{before:>13.3f}{now:>10.3f}{ratio:>7.2f}x'
+              f'{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def main():
+    """The entry point for the program."""
+    parser = argparse.ArgumentParser(description='''Benchmark QC modules and
+        the command line on synthetic FastQC files and compare against a
+        baseline.''')
+    parser.add_argument('-o', '--output',
+                        help='File to write the results to as JSON')
+    parser.add_argument('--profiles', nargs='+',
+                        choices=sorted(synthetic.PROFILES),
+                        default=sorted(synthetic.PROFILES),
+                        help='Profiles to benchmark (default: all)')
+    parser.add_argument('-n', '--runs', type=int, default=3,
+                        help='Number of timed runs (best is compared)')
+    parser.add_argument('--data', metavar='DIR',
+                        help='''Directory to keep the synthetic files in
+                        (default: a temporary directory)''')
+    parser.add_argument('--baseline', metavar='FILE',
+                        default=DEFAULT_BASELINE,
+                        help='''Results to compare against (default:
+                        benchmarks/baseline.json, if present)''')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Write the results to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='''Allowed slow-down as a fraction of the baseline
+                        time (default: 0.25)''')
+    parser.add_argument('--min-delta', type=float, default=0.01,
+                        help='''Slow-downs below this many seconds are not
+                        regressions (default: 0.01)''')
+    parser.add_argument('--no-cli', action='store_true',
+                        help='Skip the end-to-end command line benchmark')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datadir = args.data or tmp
+        benchmarks = {}
+        for name in args.profiles:
+            print(f'Benchmarking {name}...', file=sys.stderr)
+            benchmarks.update(run_profile(name, datadir, args.runs,
+                                          cli=not args.no_cli))
+    results = dict(version=RESULTS_VERSION, runs=args.runs,
+                   python=platform.python_version(),
+                   machine=platform.machine(), benchmarks=benchmarks)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('version') != RESULTS_VERSION:
+            sys.exit(f'Baseline {args.baseline} has an unknown format.')
+        regressions = compare(benchmarks, baseline['benchmarks'],
+                              args.tolerance, args.min_delta)
+    else:
+        print(f'{"benchmark":<52}{"best (s)":>10}{"median (s)":>12}')
+        for name, timing in benchmarks.items():
+            print(f'{name:<52}{timing["best_s"]:>10.3f}'
+                  f'{timing["median_s"]:>12.3f}')
+
+    outputs = [args.output] if args.output else []
+    if args.save_baseline:
+        outputs.append(args.baseline)
+    for path in outputs:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if regressions:
+        sys.exit(f'{len(regressions)} benchmark(s) regressed by more than '
+                 f'{args.tolerance:.0%}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Synthetic FastQC data for FastQC Report Generator benchmarks
+
+Writes ``fastqc_data.txt`` files holding every QC module, sized like the runs
+the tool is used on:
+
+- ``miseq``: small MiSeq run, 2x250 bp reads on 38 tiles;
+- ``longread``: long reads of variable length (up to 1,500 bp) on one tile,
+  with binned length distribution;
+- ``novaseq_s4``: NovaSeq S4 flowcell, 151 bp reads on 3,744 tiles with large
+  Kmer Content and Overrepresented sequences tables.
+
+Values are drawn from a seeded generator, so each profile always produces the
+same file. Base positions are not grouped, as in FastQC's ``--nogroup``
+output which the analysis modules read.
+
+Usage::
+
+    python benchmarks/synthetic.py outdir [--profiles miseq ...] [--seed N]
+
+.. py:function: tile_ids: tile numbers of a flowcell layout.
+.. py:function: generate: build the text of a synthetic FastQC file.
+.. py:function: write_profile: write a synthetic FastQC file for a profile.
+.. py:function: main: entry point to program.
+"""
+import argparse
+import os
+import random
+
+# generator settings of each benchmark profile
+PROFILES = dict(
+    miseq=dict(read_length=250, min_length=250, lanes=1, surfaces=2,
+               swaths=1, tiles_per_swath=19, kmers=20, overrepresented=10,
+               reads=25_000_000),
+    longread=dict(read_length=1500, min_length=100, lanes=1, surfaces=1,
+                  swaths=1, tiles_per_swath=1, kmers=50, overrepresented=50,
+                  reads=4_000_000),
+    novaseq_s4=dict(read_length=151, min_length=151, lanes=4, surfaces=2,
+                    swaths=6, tiles_per_swath=78, kmers=5000,
+                    overrepresented=20000, reads=10_000_000_000),
+)
+ADAPTERS = ('Illumina Universal Adapter', 'Illumina Small RNA Adapter',
+            'Nextera Transposase Sequence', 'SOLID Small RNA Adapter')
+DUPLICATION_LEVELS = ('1', '2', '3', '4', '5', '6', '7', '8', '9', '>10',
+                      '>50', '>100', '>500', '>1k', '>5k', '>10k+')
+
+
+def tile_ids(lanes, surfaces, swaths, tiles_per_swath):
+    """
+    .. py:function:: tile_ids(lanes, surfaces, swaths, tiles_per_swath)
+
+    Numbers the tiles of a flowcell as lane, surface, swath and tile digits,
+    e.g. 11101 for lane 1, surface 1, swath 1, tile 1.
+
+    :return: tile numbers
+    :rtype: list
+    """
+    return [int(f'{lane}{surface}{swath}{tile:02d}')
+            for lane in range(1, lanes + 1)
+            for surface in range(1, surfaces + 1)
+            for swath in range(1, swaths + 1)
+            for tile in range(1, tiles_per_swath + 1)]
+
+
+def section(name, status, header, rows):
+    """Format one module section.
+
+    :param name: QC module name
+    :type name: str
+    :param status: filter status
+    :type status: str
+    :param header: header lines, each a list of fields
+    :type header: list
+    :param rows: data rows, each a list of fields
+    :type rows: iterable
+    :return: section text
+    :rtype: str
+    """
+    lines = [f'>>{name}\t{status}']
+    lines += ['\t'.join(map(str, fields)) for fields in header]
+    lines += ['\t'.join(map(str, fields)) for fields in rows]
+    lines.append('>>END_MODULE')
+    return '\n'.join(lines) + '\n'
+
+
+def generate(name, seed=0):
+    """
+    .. py:function:: generate(name, seed=0)
+
+    Builds the text of a synthetic FastQC file for a benchmark profile.
+
+    :param name: profile name, a key of PROFILES
+    :type name: str
+    :param seed: seed of the random generator
+    :type seed: int
+    :return: fastqc_data.txt content
+    :rtype: str
+    """
+    profile = PROFILES[name]
+    rng = random.Random(f'{name}:{seed}')
+    length = profile['read_length']
+    bases = range(1, length + 1)
+    tiles = tile_ids(profile['lanes'], profile['surfaces'], profile['swaths'],
+                     profile['tiles_per_swath'])
+    reads = profile['reads']
+
+    def quality(base):
+        # quality drifts down along the read
+        return max(2.0, 36.0 - 12.0 * base / length + rng.gauss(0, 0.5))
+
+    out = ['##FastQC\t0.11.9\n']
+    length_range = (str(length) if profile['min_length'] == length
+                    else f'{profile["min_length"]}-{length}')
+    out.append(section('Basic Statistics', 'pass', [['#Measure', 'Value']], [
+        ['Filename', f'{name}.fastq.gz'],
+        ['File type', 'Conventional base calls'],
+        ['Encoding', 'Sanger / Illumina 1.9'],
+        ['Total Sequences', reads],
+        ['Sequences flagged as poor quality', 0],
+        ['Sequence length', length_range],
+        ['%GC', 46]]))
+
+    rows = []
+    for base in bases:
+        mean = quality(base)
+        rows.append([base, round(mean, 2), round(mean + 1), round(mean - 2),
+                     round(mean + 2), round(mean - 6), round(mean + 3)])
+    out.append(section('Per base sequence quality', 'pass', [[
+        '#Base', 'Mean', 'Median', 'Lower Quartile', 'Upper Quartile',
+        '10th Percentile', '90th Percentile']], rows))
+
+    out.append(section(
+        'Per tile sequence quality', 'warn', [['#Tile', 'Base', 'Mean']],
+        ([tile, base, round(rng.gauss(0, 1.5), 3)]
+         for tile in tiles for base in bases)))
+
+    out.append(section(
+        'Per sequence quality scores', 'pass', [['#Quality', 'Count']],
+        ([q, round(reads * 0.9 ** (40 - q) / 10, 1)] for q in range(2, 41))))
+
+    rows = []
+    for base in bases:
+        g, a, t = (25 + rng.gauss(0, 1) for _ in range(3))
+        rows.append([base, round(g, 3), round(a, 3), round(t, 3),
+                     round(100 - g - a - t, 3)])
+    out.append(section('Per base sequence content', 'warn',
+                       [['#Base', 'G', 'A', 'T', 'C']], rows))
+
+    out.append(section(
+        'Per sequence GC content', 'pass', [['#GC Content', 'Count']],
+        ([gc, round(reads * 2.718 ** (-((gc - 46) / 10) ** 2 / 2) / 25, 1)]
+         for gc in range(101))))
+
+    out.append(section(
+        'Per base N content', 'pass', [['#Base', 'N-Count']],
+        ([base, round(abs(rng.gauss(0, 0.01)), 4)] for base in bases)))
+
+    if profile['min_length'] == length:
+        rows = [[length, float(reads)]]
+    else:
+        # long reads are binned by 100 bp
+        rows = [[f'{start}-{start + 99}', float(rng.randint(1, 10000))]
+                for start in range(profile['min_length'], length, 100)]
+    out.append(section('Sequence Length Distribution', 'warn',
+                       [['#Length', 'Count']], rows))
+
+    out.append(section(
+        'Sequence Duplication Levels', 'pass',
+        [['#Total Deduplicated Percentage', 82.4],
+         ['#Duplication Level', 'Percentage of deduplicated',
+          'Percentage of total']],
+        ([level, round(80 * 0.5 ** i, 3), round(70 * 0.6 ** i, 3)]
+         for i, level in enumerate(DUPLICATION_LEVELS))))
+
+    rows = []
+    for i in range(profile['overrepresented']):
+        count = max(1, int(reads * 0.001 / (i + 1)))
+        rows.append([''.join(rng.choice('ACGT') for _ in range(50)), count,
+                     round(100 * count / reads, 6), 'No Hit'])
+    out.append(section('Overrepresented sequences', 'warn', [[
+        '#Sequence', 'Count', 'Percentage', 'Possible Source']], rows))
+
+    out.append(section(
+        'Adapter Content', 'pass', [['#Position'] + list(ADAPTERS)],
+        ([base] + [round(max(0.0, (base - length * 0.6) / length), 4), 0.0,
+                   0.0, 0.0] for base in bases)))
+
+    rows = []
+    for i in range(profile['kmers']):
+        rows.append([''.join(rng.choice('ACGT') for _ in range(7)),
+                     rng.randint(1000, 100000), 0.0,
+                     round(rng.uniform(5, 50), 5), rng.randint(1, length)])
+    out.append(section('Kmer Content', 'fail', [[
+        '#Sequence', 'Count', 'PValue', 'Obs/Exp Max',
+        'Max Obs/Exp Position']], rows))
+    return ''.join(out)
+
+
+def write_profile(name, outdir, seed=0):
+    """
+    .. py:function:: write_profile(name, outdir, seed=0)
+
+    Writes a synthetic FastQC file for a benchmark profile, reusing a file
+    written before with the same seed.
+
+    :param name: profile name, a key of PROFILES
+    :type name: str
+    :param outdir: directory to write to
+    :type outdir: str
+    :param seed: seed of the random generator
+    :type seed: int
+    :return: path of the FastQC file
+    :rtype: str
+    """
+    path = os.path.join(outdir, f'{name}_seed{seed}_fastqc_data.txt')
+    if not os.path.exists(path):
+        os.makedirs(outdir, exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(generate(name, seed))
+        os.replace(tmp, path)
+    return path
+
+
+def main():
+    """The entry point for the program."""
+    parser = argparse.ArgumentParser(description='''Write synthetic FastQC
+        files for benchmarking.''')
+    parser.add_argument('outdir', help='Directory to write the files to')
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES),
+                        default=sorted(PROFILES),
+                        help='Profiles to write (default: all)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random generator (default: 0)')
+    args = parser.parse_args()
+    for name in args.profiles:
+        path = write_profile(name, args.outdir, args.seed)
+        print(f'{name}: {path} ({os.path.getsize(path) / 1e6:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
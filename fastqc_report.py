@@ -7,26 +7,42 @@ and visualise various QC module data in FastQC input files.
 :exception: ValueError: Input file does not have FastQC format.
 
 .. py:functions: create_argparse: create ArgumentParser object.
+.. py:function: get_module_options: map module args to their classes.
+.. py:function: selected_modules: list the selected module classes.
 .. py:function: process_args: parse command-line arguments.
-.. py:function: main: entry point to program.
+.. py:function: module_consumer: run a QC module once its section is read.
+.. py:function: collect_inputs: expand a batch source into FastQC files.
+.. py:function: is_fastqc_input: check a file holds FastQC data.
+.. py:function: sample_name: derive an output subdirectory name for a file.
+.. py:function: sample_names: assign unique sample names to FastQC files.
+.. py:function: process_file: run process_args on one file of a batch.
+.. py:function: process_batch: run many FastQC files on a process pool.
+.. py:function: process_aggregate: store and plot module tables of many files.
+.. py:function: process_status: write the module statuses of many files.
+.. py:function: main: entry point to program, or to the serve subcommand.
 
 """
 import argparse
+import contextlib
+import copy
+import glob
+import logging
+import os
 import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from analysis.basic_stats import BasicStatistics
+from analysis.exceptions import FastQCError, ModuleMissingError
+from analysis.fastqc_file import STDIN, FastQCFile
+from analysis.output import OUTPUT_FORMATS, create_output
+from analysis.qc_module import unattended
+from analysis.report import (MODULE_CLASSES, MODULE_OPTIONS, MODULES,
+                             load_class)
 
-from analysis import basic_stats as m1
-from analysis import base_seq_qlty as m2
-from analysis import tile_seq_qlty as m3
-from analysis import seq_qlty_scores as m4
-from analysis import base_seq_content as m5
-from analysis import seq_gc_content as m6
-from analysis import base_n_content as m7
-from analysis import seq_len_distribution as m8
-from analysis import seq_duplication_levels as m9
-from analysis import overrepresented_seqs as m10
-from analysis import adapter_content as m11
-from analysis import kmer_content as m12
+# resolution of --preview graphs
+PREVIEW_DPI = 50
 
 
 def create_argparser():
@@ -42,37 +58,143 @@ def create_argparser():
         QC module visualiser.''')
     # Add flags
     parser.add_argument('file', metavar='fastqc_file', type=str,
-                        help='FastQC file for parsing')
+                        help='''FastQC file for parsing: fastqc_data.txt,
+                        fastqc_data.txt.gz, a FastQC zip archive or - to read
+                        fastqc_data.txt (plain or gzipped) from stdin''')
     parser.add_argument('outdir', metavar='outdir', help='Output directory')
     parser.add_argument('m1', metavar='stats',
                         help='Basic statistics from FastQC')
-    parser.add_argument('-m2', '--per_base_seq_qlty', action='store_true',
-                        help='Per base sequence quality')
-    parser.add_argument('-m3', '--per_tile_seq_qlty', action='store_true',
-                        help='Per tile sequence quality')
-    parser.add_argument('-m4', '--per_seq_qlty_scores', action='store_true',
-                        help='Per sequence quality scores')
-    parser.add_argument('-m5', '--per_base_seq_content', action='store_true',
-                        help='Per base sequence content')
-    parser.add_argument('-m6', '--per_sequence_gc_content', action='store_true',
-                        help='Per sequence GC content')
-    parser.add_argument('-m7', '--per_base_n_content', action='store_true',
-                        help='Per base N content')
-    parser.add_argument('-m8', '--seq_len_dist', action='store_true',
-                        help='Sequence Length Distribution')
-    parser.add_argument('-m9', '--seq_dup_levels', action='store_true',
-                        help='Sequence Duplication Levels')
-    parser.add_argument('-m10', '--overrep_seq', action='store_true',
-                        help='Overrepresented sequences')
-    parser.add_argument('-m11', '--adapter_content', action='store_true',
-                        help='Adapter Content')
-    parser.add_argument('-m12', '--kmer_content', action='store_true',
-                        help='K-mer Content')
+    # -m2 to -m12 select the optional modules, in FastQC order
+    for number, (name, option, _) in enumerate(MODULES[1:], start=2):
+        parser.add_argument(f'-m{number}', f'--{option}', action='store_true',
+                            help=name)
     parser.add_argument('-all', '--all_modules', action='store_true',
                         help='All QC analysis')
+    parser.add_argument('-f', '--format', dest='graph_format', default='png',
+                        choices=('png', 'svg', 'pdf', 'webp'),
+                        help='Graph file format (default: png)')
+    parser.add_argument('--dpi', type=int, default=None,
+                        help='''Resolution of raster graphs (default: 300, or
+                        50 with --preview)''')
+    parser.add_argument('--no_tight', action='store_true',
+                        help='''Save graphs without cropping them to their
+                        content (bbox_inches='tight')''')
+    parser.add_argument('--preview', action='store_true',
+                        help='''Fast low-resolution thumbnails for dashboards
+                        (implies --no_tight and a default of --dpi 50)''')
+    parser.add_argument('--reuse_figures', action='store_true',
+                        help='''Keep each module's figure and only update its
+                        data for later files with the same layout, e.g. in
+                        batch mode or service mode''')
+    parser.add_argument('--html', action='store_true',
+                        help='''Write one self-contained report.html with the
+                        status and graph of every selected module instead of
+                        a directory per module''')
+    parser.add_argument('--pdf', action='store_true',
+                        help='''Write one multi-page report.pdf instead of a
+                        directory per module (may be combined with --html)''')
+    parser.add_argument('--output', default='dir', choices=OUTPUT_FORMATS,
+                        help='''Layout of the module outputs: a directory per
+                        module (dir, default), or a single outdir.zip or
+                        outdir.tar archive written in one pass, e.g. for
+                        network file systems where creating many small
+                        files is slow''')
+    parser.add_argument('--max_tiles', type=int, default=None,
+                        help='''Average neighbouring tiles in the per tile
+                        quality heatmap so at most this many rows are drawn''')
+    exists = parser.add_mutually_exclusive_group()
+    exists.add_argument('--overwrite', dest='on_exists',
+                        action='store_const', const='overwrite',
+                        help='Overwrite existing module directories')
+    exists.add_argument('--skip-existing', dest='on_exists',
+                        action='store_const', const='skip',
+                        help='''Skip modules whose outputs exist and are newer
+                        than the input file''')
+    exists.add_argument('--fail-if-exists', dest='on_exists',
+                        action='store_const', const='fail',
+                        help='''Exit with an error if a module directory exists
+                        and its outputs are not up to date''')
+    parser.set_defaults(on_exists='ask')
+    parser.add_argument('-r', '--render_jobs', type=int, default=1,
+                        help='''Number of worker processes rendering module
+                        graphs in parallel (default: 1, render in-process)''')
+    parser.add_argument('--profile', action='store_true',
+                        help='''Write the wall time and peak memory of each
+                        module stage to profile.json in outdir (graphs are
+                        then rendered in-process)''')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='''With --profile, also write cProfile
+                        statistics of the slowest module to profile.prof''')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='''Treat fastqc_file as a glob, a directory or a
+                        manifest file listing one FastQC file per line, and
+                        write each file's output to its own subdirectory of
+                        outdir. Implied when fastqc_file is a directory''')
+    parser.add_argument('--pipeline', nargs='?', type=int, const=2,
+                        default=None, metavar='N',
+                        help='''In batch mode, read the next N files on threads
+                        while the graphs of the current files are drawn on
+                        the -j worker processes, and write reports and filter
+                        files on threads (default N: 2)''')
+    parser.add_argument('-a', '--aggregate', action='store_true',
+                        help='''Treat fastqc_file as in batch mode, store every
+                        module table stacked over all samples in
+                        outdir/aggregate and plot them across samples''')
+    parser.add_argument('--status-only', dest='status_only', nargs='?',
+                        const='tsv', default=None, choices=('tsv', 'json'),
+                        help='''Treat fastqc_file as in batch mode and only
+                        write the pass/warn/fail status of every module of
+                        every file to outdir/status.tsv (or status.json),
+                        without parsing tables or drawing graphs''')
+    parser.add_argument('--cache', nargs='?', const='', default=None,
+                        metavar='DIR',
+                        help='''Cache parsed sections and typed module tables
+                        on disk so later runs on the same file skip parsing
+                        (default DIR: ~/.cache/fastqc_report)''')
+    parser.add_argument('--cache_size', type=int, default=512,
+                        help='''Size limit of the cache in MB, least recently
+                        used entries are evicted beyond it (default: 512)''')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of worker processes in batch mode')
     return parser
 
 
+def get_module_options(args):
+    """
+    .. py:function:: get_module_options(args)
+
+    Maps each optional module name to whether it was selected and its class.
+
+    :param args: command-line arguments
+    :type args: Namespace obj
+    :return: [selected, 'submodule.Class'] keyed by module argument name
+    :rtype: dict
+    """
+    return {name: [getattr(args, name), path]
+            for name, path in MODULE_OPTIONS.items()}
+
+
+def selected_modules(args):
+    """
+    .. py:function:: selected_modules(args)
+
+    Lists the optional modules selected on the command line with their
+    module-specific constructor options.
+
+    :param args: command-line arguments
+    :type args: Namespace obj
+    :return: ('submodule.Class', options) pairs in FastQC order
+    :rtype: list(tuple(str, dict))
+    """
+    # constructor options specific to individual modules
+    module_kwargs = dict(
+        per_tile_seq_qlty=dict(max_tiles=args.max_tiles)
+    )
+    return [(path, module_kwargs.get(name, {}))
+            for name, (selected, path) in get_module_options(args).items()
+            if args.all_modules or selected]
+
+
 def process_args(args):
     """
     .. py:function:: process_args(args)
@@ -85,61 +207,415 @@ def process_args(args):
     :return: None
     :rtype: None
     """
-    # dict mapping optional module names with corresponding cml args and classes
-    module_options = dict(
-        per_base_seq_qlty=[args.per_base_seq_qlty, m2.PerBaseSeqQlty],
-        per_tile_seq_qlty=[args.per_tile_seq_qlty, m3.PerTileSeqQlty],
-        per_seq_qlty_scores=[args.per_seq_qlty_scores, m4.PerSeqQltyScores],
-        per_base_seq_content=[args.per_base_seq_content, m5.PerBaseSeqContent],
-        per_sequence_gc_content=[args.per_sequence_gc_content,
-                                 m6.PerSeqGCContent],
-        per_base_n_content=[args.per_base_n_content, m7.PerBaseNContent],
-        seq_len_dist=[args.seq_len_dist, m8.SeqLengthDistribution],
-        seq_dup_levels=[args.seq_dup_levels, m9.SeqDuplicationLevels],
-        overrep_seq=[args.overrep_seq, m10.OverrepresentedSeqs],
-        adapter_content=[args.adapter_content, m11.AdapterContent],
-        kmer_content=[args.kmer_content, m12.KmerContent]
-    )
-
     if args.file:
         if args.outdir:
-            try:
+            cache = None
+            if args.cache is not None:
+                from analysis.cache import ParseCache
+                cache = ParseCache(args.cache or None,
+                                   args.cache_size * 1024 ** 2)
+            # a combined report replaces the module directories
+            report = None
+            if args.html or args.pdf:
+                from analysis.combined_report import CombinedReport
+                report = CombinedReport(args.outdir, args.file,
+                                        html=args.html, pdf=args.pdf,
+                                        on_exists=args.on_exists)
+            # module outputs go to directories or to one archive
+            output = create_output(args.output, args.outdir, args.file,
+                                   args.on_exists)
+            # render graphs in worker processes if requested, reports and
+            # filter files are still written here in module order
+            scheduler = None
+            if args.render_jobs > 1 and report is None:
+                from analysis.render import RenderScheduler
+                scheduler = RenderScheduler(args.render_jobs)
+            # --preview trades resolution and cropping for speed
+            dpi = args.dpi or (PREVIEW_DPI if args.preview else 300)
+            profiler = None
+            if args.profile or args.cprofile:
+                from analysis.profiling import Profiler
+                profiler = Profiler(cprofile=args.cprofile)
+                profiler.start()
+            options = dict(scheduler=scheduler, on_exists=args.on_exists,
+                           graph_format=args.graph_format, dpi=dpi,
+                           tight=not (args.no_tight or args.preview),
+                           profiler=profiler,
+                           reuse_figures=args.reuse_figures, output=output)
+
+            def basic_statistics(fastqc):
                 # generate basic stats using input file
-                stats = m1.BasicStatistics(args.file, args.outdir)
-                stats.module_output()
-            except FileNotFoundError:
-                # If input file is not found notify user and exit program
-                print('Input file not found.')
-                sys.exit(1)
-            else:
-                # Loop through module arg names and call appropriate classes
+                module_consumer(BasicStatistics, args.outdir,
+                                profiler=profiler)(fastqc)
+                if report is not None and write_modules:
+                    report.add(BasicStatistics(fastqc, args.outdir))
                 if args.all_modules:
-                    print('Generating reports and graphs for all remaining analysis...')
-                    for name in module_options:
-                        # If user provides 'all' arg then instantiate all module
-                        # classes
-                        module = module_options[name][1](args.file, args.outdir)
-                        module.module_output()
-                        # notify user all reports have been created
-                        if name == "kmer_content":
-                            print("All module reports have been created.")
-                            sys.exit(0)
+                    print('Generating reports and graphs for all remaining '
+                          'analysis...')
+
+            # each selected module is run as soon as its section has been
+            # read, so piped input is consumed once, while it arrives
+            consumers = {'Basic Statistics': basic_statistics}
+            section_names = {path: name
+                             for name, path in MODULE_CLASSES.items()}
+            write_modules = (output.prepare() if report is None
+                             else report.prepare())
+            # If user provides 'all' arg then instantiate all module classes,
+            # else the classes of the module args provided
+            for path, module_kwargs in (selected_modules(args)
+                                        if write_modules else []):
+                kwargs = dict(options, **module_kwargs)
+                consumers[section_names[path]] = (
+                    module_consumer(load_class(path), args.outdir, **kwargs)
+                    if report is None
+                    else report.consumer(load_class(path), **kwargs))
+            # the archive is completed once every graph has been rendered
+            with output, scheduler or contextlib.nullcontext():
+                try:
+                    # parse the input once and share it with every module
+                    with (profiler.stage('FastQC file', 'read') if profiler
+                          else contextlib.nullcontext()):
+                        fastqc = FastQCFile(args.file, cache=cache,
+                                            consumers=consumers)
+                except FileNotFoundError:
+                    # If input file is not found notify user and exit program
+                    print('Input file not found.')
+                    sys.exit(1)
+                for name in consumers:
+                    # selected modules never consumed are missing from input
+                    if fastqc.section(name) is None:
+                        raise ModuleMissingError(
+                            f'Module "{name}" missing from input file.')
+            if report is not None and write_modules:
+                report.write()
+            if profiler is not None:
+                profiler.stop()
+                path = profiler.write(args.outdir, args.file)
+                print(f'Profile written to {path}.')
+            if args.all_modules:
+                # notify user all reports have been created
+                print("All module reports have been created.")
+                sys.exit(0)
+
 
+def module_consumer(module_class, outdir, **kwargs):
+    """
+    .. py:function:: module_consumer(module_class, outdir, **kwargs)
+
+    Creates a section consumer which generates all output of a QC module once
+    the module's section has been read from the input.
+
+    :param module_class: QC module class
+    :type module_class: type
+    :param outdir: output directory
+    :type outdir: str
+    :param kwargs: options passed on to the module constructor
+    :return: consumer called with the FastQCFile being read
+    :rtype: function
+    """
+    def consume(fastqc):
+        module = module_class(fastqc, outdir, **kwargs)
+        if module.profiler is not None:
+            module.profiler.run(module)
+        else:
+            module.module_output()
+    return consume
+
+
+def collect_inputs(source):
+    """
+    .. py:function:: collect_inputs(source)
+
+    Expands a batch source into a sorted list of FastQC files. The source may
+    be a glob pattern, a directory (searched recursively for fastqc_data.txt,
+    fastqc_data.txt.gz and FastQC zip archives) or a manifest file listing one
+    FastQC file per line. A sample found in a directory both as a zip archive
+    and extracted next to it is only run once, from the extracted data.
+
+    :param source: glob pattern, directory or manifest file
+    :type source: str
+    :return: paths of FastQC files
+    :rtype: list
+    """
+    if os.path.isdir(source):
+        found = {}
+        # in order of preference for a sample found more than once
+        for name in ('fastqc_data.txt', 'fastqc_data.txt.gz', '*_fastqc.zip'):
+            pattern = os.path.join(source, '**', name)
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                # the directory of an extracted sample, or that a zip
+                # archive extracts to
+                sample = (os.path.dirname(path)
+                          if os.path.basename(path).startswith('fastqc_data')
+                          else os.path.splitext(path)[0])
+                if sample in found:
+                    print(f'Skipped {path}: duplicate of {found[sample]}.')
                 else:
-                    for name in module_options:
-                        if module_options[name][0]:
-                            # else if independent module args are provided then
-                            # instantiate the respective module class
-                            module = module_options[name][1](args.file, args.outdir)
-                            module.module_output()
+                    found[sample] = path
+        return sorted(found.values())
+    if os.path.isfile(source) and not is_fastqc_input(source):
+        # manifest: one path per line, blank lines and comments ignored
+        with open(source, 'r') as f:
+            return [line.strip() for line in f
+                    if line.strip() and not line.startswith('#')]
+    return sorted(glob.glob(source, recursive=True))
+
+
+def is_fastqc_input(path):
+    """
+    .. py:function:: is_fastqc_input(path)
+
+    Checks whether a file is FastQC data (plain, gzipped or a FastQC zip
+    archive) rather than a batch manifest.
+
+    :param path: path of file
+    :type path: str
+    :return: True if the file holds FastQC data
+    :rtype: bool
+    """
+    if zipfile.is_zipfile(path) or path.endswith('.gz'):
+        return True
+    with open(path, 'r') as f:
+        return f.readline().startswith('##FastQC')
+
+
+def sample_name(path):
+    """
+    .. py:function:: sample_name(path)
+
+    Derives the output subdirectory name for a FastQC file. Files named
+    fastqc_data.txt(.gz) take the name of their parent directory (e.g.
+    sample_fastqc), any other file or zip archive takes its base name without
+    extensions.
+
+    :param path: path of FastQC file
+    :type path: str
+    :return: sample name
+    :rtype: str
+    """
+    base = os.path.basename(path)
+    if base.endswith('.gz'):
+        base = base[:-3]
+    if base == 'fastqc_data.txt':
+        parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        return parent or os.path.splitext(base)[0]
+    return os.path.splitext(base)[0]
+
+
+def sample_names(inputs):
+    """
+    .. py:function:: sample_names(inputs)
+
+    Assigns each FastQC file a unique sample name, numbering names shared by
+    several files.
+
+    :param inputs: paths of FastQC files
+    :type inputs: list
+    :return: sample name for each path
+    :rtype: dict
+    """
+    names = {}
+    seen = {}
+    for infile in inputs:
+        name = sample_name(infile)
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f'{name}_{seen[name]}'
+        names[infile] = name
+    return names
+
+
+def process_file(args, infile, outdir):
+    """
+    .. py:function:: process_file(args, infile, outdir)
+
+    Runs process_args on a single FastQC file of a batch. Runs in a worker
+    process, so exits raised by the modules are caught and reported back.
+
+    :param args: command-line arguments shared by the batch
+    :type args: Namespace obj
+    :param infile: FastQC file to process
+    :type infile: str
+    :param outdir: output directory for this file
+    :type outdir: str
+    :return: infile, success flag and elapsed seconds
+    :rtype: tuple(str, bool, float)
+    """
+    file_args = copy.copy(args)
+    file_args.file = infile
+    file_args.outdir = outdir
+    # workers cannot prompt the user
+    file_args.on_exists = unattended(file_args.on_exists)
+    start = time.perf_counter()
+    try:
+        process_args(file_args)
+        success = True
+    except SystemExit as e:
+        # process_args exits with 0 once all modules have been generated
+        success = not e.code
+    except Exception as e:
+        print(f'{infile}: {e}')
+        success = False
+    return infile, success, time.perf_counter() - start
+
+
+def process_batch(args):
+    """
+    .. py:function:: process_batch(args)
+
+    Spreads process_args over a pool of worker processes, one FastQC file
+    per task, and prints a summary when all files have been processed. With
+    --pipeline the files are run through an asyncio pipeline instead, which
+    reads the next files while the graphs of the current ones are drawn.
+
+    :param args: command-line arguments
+    :type args: Namespace obj
+    :return: number of failed files
+    :rtype: int
+    """
+    inputs = collect_inputs(args.file)
+    if not inputs:
+        print(f'No FastQC files found for "{args.file}".')
+        return 1
+    # assign each input its own subdirectory
+    outdirs = {infile: os.path.join(args.outdir, name)
+               for infile, name in sample_names(inputs).items()}
+
+    start = time.perf_counter()
+    failed = []
+
+    def done(infile, success, elapsed):
+        if not success:
+            failed.append(infile)
+        print(f'[{"OK" if success else "FAILED"}] {infile} '
+              f'({elapsed:.2f}s)')
+
+    if args.pipeline:
+        from analysis.pipeline import run_pipeline
+
+        classes = [(load_class(path), kwargs)
+                   for path, kwargs in selected_modules(args)]
+        run_pipeline(outdirs, classes, jobs=args.jobs,
+                     prefetch=args.pipeline, output_format=args.output,
+                     callback=done,
+                     on_exists=args.on_exists,
+                     graph_format=args.graph_format,
+                     dpi=args.dpi or (PREVIEW_DPI if args.preview else 300),
+                     tight=not (args.no_tight or args.preview),
+                     reuse_figures=args.reuse_figures)
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(process_file, args, infile,
+                                   outdirs[infile])
+                       for infile in inputs]
+            for future in as_completed(futures):
+                done(*future.result())
+
+    print('-' * 80)
+    print(f'Batch completed in {time.perf_counter() - start:.2f}s: '
+          f'{len(inputs) - len(failed)} succeeded, {len(failed)} failed.')
+    for infile in sorted(failed):
+        print(f'  failed: {infile}')
+    return len(failed)
+
+
+def process_aggregate(args):
+    """
+    .. py:function:: process_aggregate(args)
+
+    Parses every FastQC file of a batch once, stores each module table
+    stacked over all samples in columnar files and draws cross-sample graphs
+    from the stored tables.
+
+    :param args: command-line arguments
+    :type args: Namespace obj
+    :return: number of samples aggregated
+    :rtype: int
+    """
+    from analysis.aggregate import aggregate, plot_aggregate
+
+    inputs = collect_inputs(args.file)
+    if not inputs:
+        print(f'No FastQC files found for "{args.file}".')
+        return 0
+    samples = {name: infile for infile, name in sample_names(inputs).items()}
+    classes = [BasicStatistics] + [load_class(path)
+                                   for path in MODULE_OPTIONS.values()]
+    store, skipped = aggregate(samples, args.outdir, classes, jobs=args.jobs)
+    aggregated = len(samples) - len(skipped)
+    if aggregated:
+        dpi = args.dpi or (PREVIEW_DPI if args.preview else 300)
+        plot_aggregate(store, graph_format=args.graph_format, dpi=dpi,
+                       tight=not (args.no_tight or args.preview))
+    print(f'Aggregated {aggregated} samples into {store}, '
+          f'{len(skipped)} skipped.')
+    for sample in sorted(skipped):
+        print(f'  skipped: {sample}')
+    return aggregated
+
+
+def process_status(args):
+    """
+    .. py:function:: process_status(args)
+
+    Reads the status of every module of every FastQC file of a batch from
+    the module header lines and writes them as one samples by modules
+    matrix.
+
+    :param args: command-line arguments
+    :type args: Namespace obj
+    :return: number of files that could not be read
+    :rtype: int
+    """
+    from analysis.status import status_matrix, write_matrix
+
+    if args.file == STDIN:
+        samples = {'stdin': STDIN}
+    else:
+        inputs = collect_inputs(args.file)
+        if not inputs:
+            print(f'No FastQC files found for "{args.file}".')
+            return 1
+        samples = {name: infile
+                   for infile, name in sample_names(inputs).items()}
+    modules, matrix, errors = status_matrix(samples, jobs=args.jobs)
+    os.makedirs(args.outdir, exist_ok=True)
+    path = os.path.join(args.outdir, f'status.{args.status_only}')
+    write_matrix(path, modules, matrix, errors, fmt=args.status_only)
+    failing = sum('fail' in statuses.values() for statuses in matrix.values())
+    print(f'Statuses of {len(matrix)} samples written to {path}: '
+          f'{failing} with failing modules, {len(errors)} unreadable.')
+    return len(errors)
 
 
 def main():
     """The entry point for the program."""
+    if sys.argv[1:2] == ['serve']:
+        # long-running service, see fastqc_server.py
+        import fastqc_server
+        fastqc_server.main(sys.argv[2:])
+        return
     parser = create_argparser()
     # parse command-line input
     args = parser.parse_args()
-    process_args(args)
+    if args.output != 'dir' and (args.html or args.pdf):
+        parser.error('--output archives hold module directories, which '
+                     '--html and --pdf replace')
+    # the analysis package reports progress through logging
+    logging.basicConfig(stream=sys.stdout, format='%(message)s',
+                        level=logging.INFO)
+    if args.status_only:
+        sys.exit(1 if process_status(args) else 0)
+    if args.aggregate:
+        sys.exit(0 if process_aggregate(args) else 1)
+    if args.batch or os.path.isdir(args.file):
+        sys.exit(1 if process_batch(args) else 0)
+    try:
+        process_args(args)
+    except FastQCError as e:
+        # e.g. a selected module missing from the input file
+        print(e)
+        sys.exit(1)
 
 
 if __name__ == '__main__':
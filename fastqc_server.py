@@ -0,0 +1,431 @@
+"""FastQC Report Generator service
+
+Long-running service started with ``fastqc_report.py serve`` which keeps the
+Python interpreter, the plotting libraries and their fonts loaded in a pool of
+worker processes, so that report jobs don't pay start-up and import time.
+
+Jobs are submitted as JSON over HTTP on a local TCP port or a Unix socket:
+
+``POST /jobs``
+    ``{"file": ..., "outdir": ..., "modules": [...], "args": [...],
+    "wait": false}`` where modules are command-line module names (e.g.
+    ``per_base_seq_qlty``) or ``"all"`` and args are further command-line
+    flags, e.g. ``["--overwrite", "--preview"]``.
+``GET /jobs`` and ``GET /jobs/<id>``
+    job records with their status, log and timing; only the records of the
+    last ``--keep-jobs`` finished jobs are kept.
+``GET /health``
+    worker and job counts.
+
+.. py:function: create_serve_argparser: create ArgumentParser object.
+.. py:function: init_worker: load libraries and fonts in a worker process.
+.. py:function: run_job: run process_args for one job in a worker process.
+.. py:function: job_args: build command-line arguments for a job.
+.. py:function: serve: run the service until interrupted.
+.. py:function: main: entry point of the serve subcommand.
+"""
+import argparse
+import collections
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from analysis.qc_module import unattended
+from analysis.report import MODULE_OPTIONS, load_class
+from fastqc_report import create_argparser, get_module_options, process_args
+
+logger = logging.getLogger('fastqc_server')
+
+
+def create_serve_argparser():
+    """
+    .. py:function:: create_serve_argparser()
+
+    Creates parser for parsing command-line input for the serve subcommand.
+
+    :return: parser: ArgumentParser Object required for command-line parsing
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        prog='fastqc_report.py serve',
+        description='''Serve FastQC report jobs over local HTTP from a pool of
+        warm worker processes.''')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='TCP port to listen on (default: 8765)')
+    parser.add_argument('--socket', default=None,
+                        help='''Listen on this Unix socket instead of a TCP
+                        port''')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of worker processes running jobs')
+    parser.add_argument('--keep-jobs', type=int, default=1000,
+                        help='''Number of finished job records kept
+                        (default: 1000)''')
+    return parser
+
+
+def init_worker():
+    """Load the plotting stack, every QC module and the fonts in a worker
+    process, so the first job it runs starts warm.
+
+    :return: None
+    :rtype: None
+    """
+    # interrupts are handled by the service, which waits for running jobs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    for path in MODULE_OPTIONS.values():
+        load_class(path)
+    # drawing text loads the font files once
+    fig = Figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, 'FastQC')
+    fig.savefig(io.BytesIO(), format='png')
+    # job logs are collected per job instead of written to the console
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def run_job(args):
+    """Run process_args for one job in a worker process, collecting its log.
+
+    :param args: command-line arguments of the job
+    :type args: Namespace obj
+    :return: error message (None on success), log, start time (seconds since
+        the epoch) and elapsed seconds
+    :rtype: tuple(str, str, float, float)
+    """
+    started = time.time()
+    start = time.perf_counter()
+    log = io.StringIO()
+    handler = logging.StreamHandler(log)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    error = None
+    try:
+        with contextlib.redirect_stdout(log):
+            process_args(args)
+    except SystemExit as e:
+        # process_args exits with 0 once all modules have been generated
+        if e.code:
+            error = f'exit status {e.code}'
+    except Exception as e:
+        error = str(e)
+    finally:
+        root.removeHandler(handler)
+    return error, log.getvalue(), started, time.perf_counter() - start
+
+
+def job_args(job):
+    """Build the command-line arguments of a job, checking its modules
+    against the module options that process_args selects classes from.
+
+    :param job: job request with file, outdir, modules and optional args
+    :type job: dict
+    :return: command-line arguments
+    :rtype: Namespace obj
+    :raises: ValueError: if the job request is invalid
+    """
+    if not isinstance(job, dict) or not job.get('file') \
+            or not job.get('outdir'):
+        raise ValueError('A job needs "file" and "outdir".')
+    modules = job.get('modules', [])
+    if isinstance(modules, str):
+        modules = [modules]
+    argv = [str(job['file']), str(job['outdir']), 'm1']
+    argv += [str(arg) for arg in job.get('args', [])]
+    try:
+        # argparse reports bad arguments on stderr and exits
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            args = create_argparser().parse_args(argv)
+    except SystemExit:
+        message = err.getvalue().strip() or 'Invalid job arguments.'
+        raise ValueError(message.splitlines()[-1])
+    if args.batch or args.aggregate or args.file == '-':
+        raise ValueError('A job processes a single input file.')
+    # the same mapping process_args selects the module classes from
+    module_options = get_module_options(args)
+    unknown = [str(name) for name in modules
+               if name != 'all' and name not in module_options]
+    if unknown:
+        raise ValueError(f'Unknown modules: {", ".join(unknown)}.')
+    for name in modules:
+        if name == 'all':
+            args.all_modules = True
+        else:
+            setattr(args, name, True)
+    # workers cannot prompt the user
+    args.on_exists = unattended(args.on_exists)
+    return args
+
+
+class JobQueue:
+    """Job records and the worker pool running them."""
+
+    def __init__(self, jobs, keep=1000):
+        """Constructor for JobQueue objects.
+
+        :param jobs: number of worker processes
+        :type jobs: int
+        :param keep: number of finished job records kept, the oldest are
+            dropped first
+        :type keep: int
+        """
+        self.workers = jobs
+        self.pool = ProcessPoolExecutor(max_workers=jobs,
+                                        initializer=init_worker)
+        # workers are started on demand, so start them all before any job
+        wait([self.pool.submit(int) for _ in range(jobs)])
+        self.records = {}
+        self.done = {}
+        # ids of finished jobs, oldest first
+        self.finished = collections.deque()
+        self.keep = max(1, keep)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        """Queue a job on the worker pool.
+
+        :param job: job request
+        :type job: dict
+        :return: job record
+        :rtype: dict
+        :raises: ValueError: if the job request is invalid
+        """
+        args = job_args(job)
+        with self.lock:
+            job_id = str(next(self.ids))
+            record = dict(id=job_id, file=args.file, outdir=args.outdir,
+                          modules=job.get('modules', []), status='pending',
+                          submitted=time.time())
+            self.records[job_id] = record
+            self.done[job_id] = threading.Event()
+            future = self.pool.submit(run_job, args)
+            submitted = dict(record)
+        future.add_done_callback(lambda f: self.finish(job_id, f))
+        return submitted
+
+    def finish(self, job_id, future):
+        """Record the result and timing of a finished job.
+
+        :param job_id: job id
+        :type job_id: str
+        :param future: future of the job
+        :type future: concurrent.futures.Future
+        :return: None
+        :rtype: None
+        """
+        try:
+            error, log, started, elapsed = future.result()
+        except Exception as e:
+            # e.g. a worker process that died
+            error, log, started, elapsed = str(e), '', time.time(), 0.0
+        with self.lock:
+            record = self.records[job_id]
+            record.update(
+                status='failed' if error else 'succeeded', error=error,
+                log=log, queued_s=round(started - record['submitted'], 6),
+                run_s=round(elapsed, 6),
+                total_s=round(time.time() - record['submitted'], 6))
+            self.done.pop(job_id).set()
+            self.finished.append(job_id)
+            while len(self.finished) > self.keep:
+                self.records.pop(self.finished.popleft())
+        logger.info(f'job {job_id} {record["status"]} in {elapsed:.3f}s: '
+                    f'{record["file"]}')
+
+    def wait(self, job_id):
+        """Block until a job has finished.
+
+        :param job_id: job id
+        :type job_id: str
+        :return: job record or None if it has been dropped
+        :rtype: dict
+        """
+        with self.lock:
+            done = self.done.get(job_id)
+        if done is not None:
+            done.wait()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Return a copy of a job record.
+
+        :param job_id: job id
+        :type job_id: str
+        :return: job record or None if there is no such job, or its record
+            has been dropped
+        :rtype: dict
+        """
+        with self.lock:
+            record = self.records.get(job_id)
+            return dict(record) if record is not None else None
+
+    def summary(self):
+        """Count the jobs by status.
+
+        :return: number of workers and jobs per status
+        :rtype: dict
+        """
+        with self.lock:
+            counts = {}
+            for record in self.records.values():
+                counts[record['status']] = counts.get(record['status'], 0) + 1
+        return dict(status='ok', workers=self.workers, jobs=counts)
+
+    def shutdown(self):
+        """Wait for running jobs and stop the worker pool.
+
+        :return: None
+        :rtype: None
+        """
+        self.pool.shutdown()
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """HTTP request handler of the job endpoints."""
+
+    # set by serve
+    queue = None
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def send_json(self, status, body):
+        """Send a JSON response.
+
+        :param status: HTTP status
+        :type status: http.HTTPStatus
+        :param body: response body
+        :type body: dict or list
+        :return: None
+        :rtype: None
+        """
+        data = json.dumps(body, indent=2).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/health':
+            self.send_json(HTTPStatus.OK, self.queue.summary())
+        elif path == '/jobs':
+            with self.queue.lock:
+                ids = list(self.queue.records)
+            self.send_json(HTTPStatus.OK,
+                           [self.queue.get(job_id) for job_id in ids])
+        elif path.startswith('/jobs/'):
+            record = self.queue.get(path[len('/jobs/'):])
+            if record is None:
+                self.send_json(HTTPStatus.NOT_FOUND, {'error': 'No such job.'})
+            else:
+                self.send_json(HTTPStatus.OK, record)
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': 'Not found.'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': 'Not found.'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = json.loads(self.rfile.read(length) or b'{}')
+            record = self.queue.submit(job)
+        except ValueError as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+            return
+        if job.get('wait'):
+            record = self.queue.wait(record['id'])
+            if record is None:
+                self.send_json(HTTPStatus.NOT_FOUND,
+                               {'error': 'No such job.'})
+            else:
+                self.send_json(HTTPStatus.OK, record)
+        else:
+            self.send_json(HTTPStatus.ACCEPTED, record)
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """HTTP server listening on a Unix socket."""
+
+    daemon_threads = True
+
+
+def serve(args):
+    """
+    .. py:function:: serve(args)
+
+    Runs the service until interrupted.
+
+    :param args: command-line arguments of the serve subcommand
+    :type args: Namespace obj
+    :return: None
+    :rtype: None
+    """
+    queue = JobQueue(args.jobs, keep=args.keep_jobs)
+    handler = type('Handler', (JobHandler,), {'queue': queue})
+    if args.socket:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, handler)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+        address = f'http://{args.host}:{server.server_port}'
+    logger.info(f'Serving FastQC report jobs on {address} with '
+                f'{args.jobs} workers.')
+    # stop on SIGTERM as on an interrupt
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.shutdown()
+        if args.socket:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(args.socket)
+
+
+def main(argv=None):
+    """The entry point of the serve subcommand.
+
+    :param argv: command-line arguments after 'serve'
+    :type argv: list
+    :return: None
+    :rtype: None
+    """
+    args = create_serve_argparser().parse_args(argv)
+    logging.basicConfig(stream=sys.stdout, format='%(asctime)s %(message)s',
+                        level=logging.INFO)
+    serve(args)
+
+
+if __name__ == '__main__':
+    main()
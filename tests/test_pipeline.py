@@ -0,0 +1,33 @@
+import gzip
+import os
+
+from analysis.pipeline import run_pipeline
+from analysis.report import load_class
+from synthetic import write_profile
+
+MODULES = [(load_class('basic_stats.BasicStatistics'), {}),
+           (load_class('seq_len_distribution.SeqLengthDistribution'), {})]
+
+
+def test_bad_input_among_good_ones(tmp_path):
+    """A file that is not UTF-8 fails on its own and ends the run."""
+    good = [write_profile('miseq', str(tmp_path), seed) for seed in (1, 2)]
+    bad = str(tmp_path / 'bad_fastqc_data.txt.gz')
+    with gzip.open(bad, 'wb') as f:
+        f.write(b'>>Basic Statistics\tpass\n#Measure\tValue\n'
+                b'Filename\t\xff\xfe\n>>END_MODULE\n')
+    inputs = {infile: str(tmp_path / 'out' / str(i))
+              for i, infile in enumerate([good[0], bad, good[1]])}
+    done = []
+
+    failed = run_pipeline(inputs, MODULES, jobs=1, prefetch=1,
+                          callback=lambda infile, success, elapsed:
+                          done.append((infile, success)),
+                          on_exists='overwrite')
+
+    assert failed == [bad]
+    assert sorted(done) == sorted([(good[0], True), (bad, False),
+                                   (good[1], True)])
+    for infile in good:
+        assert os.path.exists(os.path.join(inputs[infile],
+                                           'Sequence_Length_Distribution'))
@@ -0,0 +1,32 @@
+import pytest
+
+from analysis.base_seq_qlty import PerBaseSeqQlty
+from analysis.exceptions import FormatError
+from analysis.fastqc_file import FastQCFile
+
+HEADER = ('>>Per base sequence quality\tpass\n'
+          '#Base\tMean\tMedian\tLower Quartile\tUpper Quartile'
+          '\t10th Percentile\t90th Percentile\n')
+
+
+def module(tmp_path, rows):
+    path = tmp_path / 'fastqc_data.txt'
+    path.write_text(HEADER + rows + '>>END_MODULE\n')
+    module = PerBaseSeqQlty(FastQCFile(str(path)), str(tmp_path / 'out'))
+    module.parse_text()
+    return module
+
+
+def test_load_table_nan(tmp_path):
+    """FastQC writes NaN in float columns, e.g. for positions without
+    reads."""
+    df = module(tmp_path, '1\t32.5\t33.0\t32.0\t34.0\t30.0\t35.0\n'
+                          '2\tNaN\tNaN\tNaN\tNaN\tNaN\tNaN\n').table()
+    assert list(df['Base']) == [1, 2]
+    assert df['Mean'].isna().tolist() == [False, True]
+
+
+def test_load_table_short_row(tmp_path):
+    with pytest.raises(FormatError):
+        module(tmp_path, '1\t32.5\t33.0\t32.0\t34.0\t30.0\t35.0\n'
+                         '2\t32.5\t33.0\n').table()